@@ -1,6 +1,9 @@
 import os
 import sys
-from flask import Flask, render_template, request, jsonify
+import json
+import time
+import uuid
+from flask import Flask, Response, g, render_template, request, jsonify, stream_with_context
 from werkzeug.utils import secure_filename
 import traceback
 
@@ -9,19 +12,128 @@ backend_path = os.path.join(os.path.dirname(__file__), 'backend')
 sys.path.insert(0, backend_path)
 
 # Import custom modules
-from modules.data_extractor import read_data, get_chart_data
-from modules.gemini_analyzer import initialize_gemini, analyze_student_data, generate_comparative_analysis, analyze_resume
+from modules.data_extractor import read_data, get_chart_data, get_compaction_stats, get_extraction_cache_stats
+from modules.job_queue import get_job_queue
+from modules.batch_analysis import expand_uploads, run_batch, get_batch_stats, BatchError
+from modules.upload_sessions import get_upload_store, UploadError, OffsetMismatch, STREAMABLE_EXTENSIONS
+from modules.resilience import get_resilience_stats
+from modules.rate_limiter import get_rate_limit_stats
+from modules.prompt_encoding import get_encoding_stats
+from modules.pdf_extractor import get_pdf_stats
+from modules.tracing import start_trace, end_trace
+from modules.metrics import observe_request, observe_upload, render_metrics
+from modules.gemini_analyzer import initialize_gemini, build_analysis_tasks, run_analyses, generate_text, stream_text, stream_analysis, get_model_stats, get_cache_stats, get_coalescing_stats
 
 # --- Flask App Configuration ---
 app = Flask(__name__)
-app.config['UPLOAD_FOLDER'] = os.path.join(backend_path, 'data')
-os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
-app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024 # 16MB limit
+app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024 # 16MB limit per request; larger files go through /api/uploads in parts
+
+@app.before_request
+def begin_trace():
+    if request.path.startswith('/api/'):
+        g.trace_token = start_trace(request.path)
+
+@app.after_request
+def finish_trace(response):
+    # Streaming responses only include the work done before the first byte
+    token = g.pop('trace_token', None)
+    if token is not None:
+        trace = end_trace(token)
+        response.headers['Server-Timing'] = trace.server_timing()
+        trace.log(method=request.method, path=request.path, status=response.status_code)
+    return response
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+@app.after_request
+def record_request_metrics(response):
+    # Observed when the response is closed, so streamed bodies are included
+    started = g.pop('request_started', None)
+    if started is not None:
+        endpoint = request.url_rule.rule if request.url_rule else 'unmatched'
+        method, status = request.method, response.status_code
+        response.call_on_close(
+            lambda: observe_request(endpoint, method, status, time.perf_counter() - started))
+    return response
+
+@app.route('/metrics')
+def metrics():
+    body, content_type, status = render_metrics()
+    return Response(body, status=status, content_type=content_type)
 
 @app.route('/')
 def index():
     return render_template('index.html')
 
+def _upload_size(file):
+    stream = file.stream
+    position = stream.tell()
+    stream.seek(0, os.SEEK_END)
+    size = stream.tell()
+    stream.seek(position)
+    return size
+
+def _load_analysis_input():
+    """
+    Reads the uploaded file or pasted text from the current request.
+
+    Returns:
+        tuple: (data_source, chart_data, analysis_type, error_response)
+               error_response is a (json, status) pair when the input is unusable.
+    """
+    file = request.files.get('file')
+    text_input = request.form.get('text_input')
+    
+    try:
+        analysis_type = int(request.form.get('analysis_type', 3))
+    except ValueError:
+        analysis_type = 3
+        
+    chart_data = None
+    data_source = None
+
+    if file and file.filename != '':
+        filename = secure_filename(file.filename)
+        observe_upload(filename, _upload_size(file))
+        
+        # Parsed straight from the upload stream; nothing is written under the
+        # shared filename, so concurrent uploads of the same name cannot collide.
+        # Comparative-only runs need column statistics, not rows, so CSVs are streamed
+        data_source = read_data(file, stats_only=analysis_type == 2, sheets=request.form.get('sheets'),
+                                filename=filename)
+        
+        if data_source is None:
+            return None, None, analysis_type, (jsonify({'error': 'Could not process file. Valid formats: CSV, Excel, PDF, Text.'}), 400)
+        
+        # Extract chart data if it's a dataframe (CSV/Excel)
+        if not isinstance(data_source, str) and analysis_type != 4:
+            chart_data = get_chart_data(data_source)
+            
+    elif text_input:
+        data_source = text_input
+    else:
+        return None, None, analysis_type, (jsonify({'error': 'Please upload a file or enter text to analyze.'}), 400)
+
+    # Mode 4 is specifically for Resume/CV
+    if analysis_type == 4 and not isinstance(data_source, str):
+        # Convert dataframe to string if someone uploaded excel as resume
+        data_source = data_source.to_string()
+
+    return data_source, chart_data, analysis_type, None
+
+def _sse(event, data):
+    """Formats one Server-Sent Event; data is JSON so embedded newlines are safe."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+def _event_stream(events):
+    return Response(
+        stream_with_context(events),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'},
+    )
+
 @app.route('/api/analyze', methods=['POST'])
 def analyze_data():
     try:
@@ -29,54 +141,14 @@ def analyze_data():
         if not model:
             return jsonify({"error": "Could not initialize Gemini API. Check API key."}), 500
 
-        file = request.files.get('file')
-        text_input = request.form.get('text_input')
-        
-        try:
-            analysis_type = int(request.form.get('analysis_type', 3))
-        except ValueError:
-            analysis_type = 3
-            
-        results = {}
-        chart_data = None
-        data_source = None
-
-        if file and file.filename != '':
-            filename = secure_filename(file.filename)
-            file_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-            file.save(file_path)
-            
-            data_source = read_data(file_path)
-            
-            if data_source is None:
-                return jsonify({'error': 'Could not process file. Valid formats: CSV, Excel, PDF, Text.'}), 400
-            
-            # Extract chart data if it's a dataframe (CSV/Excel)
-            if not isinstance(data_source, str) and analysis_type != 4:
-                chart_data = get_chart_data(data_source)
-                
-        elif text_input:
-            data_source = text_input
-        else:
-            return jsonify({'error': 'Please upload a file or enter text to analyze.'}), 400
+        data_source, chart_data, analysis_type, error = _load_analysis_input()
+        if error:
+            return error
 
         # --- Analysis Logic ---
-        # Mode 4 is specifically for Resume/CV
-        if analysis_type == 4:
-            if not isinstance(data_source, str):
-                 # Convert dataframe to string if someone uploaded excel as resume
-                 data_source = data_source.to_string()
-            results['resume'] = analyze_resume(data_source)
-        else:
-            # Modes 1, 2, 3
-            if analysis_type in [1, 3]: 
-                results['standard'] = analyze_student_data(data_source)
-
-            if analysis_type in [2, 3]: 
-                if not isinstance(data_source, str):
-                    results['comparative'] = generate_comparative_analysis(data_source)
-                elif analysis_type == 2:
-                    results['comparative'] = "Comparative analysis requires structured data (CSV/Excel). For PDF/Text, please use Individual or Resume mode."
+        # Independent analyses (e.g. standard + comparative in mode 3) run concurrently
+        tasks, results = build_analysis_tasks(data_source, analysis_type)
+        results.update(run_analyses(tasks))
         
         if not results:
              return jsonify({'error': 'No analysis was generated.'}), 400
@@ -88,12 +160,95 @@ def analyze_data():
         traceback.print_exc()
         return jsonify({"error": f"Server Error: {str(e)}"}), 500
 
+@app.route('/api/analyze/stream', methods=['POST'])
+def analyze_data_stream():
+    """Same inputs as /api/analyze, but results arrive as Server-Sent Events."""
+    try:
+        model = initialize_gemini()
+        if not model:
+            return jsonify({"error": "Could not initialize Gemini API. Check API key."}), 500
+
+        data_source, chart_data, analysis_type, error = _load_analysis_input()
+        if error:
+            return error
+    except Exception as e:
+        print(f"Error in analyze_data_stream: {e}")
+        traceback.print_exc()
+        return jsonify({"error": f"Server Error: {str(e)}"}), 500
+
+    def events():
+        yield _sse('meta', {'chart_data': chart_data})
+        try:
+            for event, data in stream_analysis(data_source, analysis_type):
+                yield _sse(event, data)
+        except Exception as e:
+            print(f"Error in analyze_data_stream: {e}")
+            yield _sse('error', {'error': f"Server Error: {str(e)}"})
+        yield _sse('done', {})
+
+    return _event_stream(events())
+
+@app.route('/api/analyze/batch', methods=['POST'])
+def analyze_batch():
+    """
+    Analyses many files in one request: repeat the 'files' form field (ZIP
+    archives are expanded) and set analysis_type as for /api/analyze.
+    Returns per-file results, plus a combined cross-class comparative report
+    when two or more files are tables. Files that cannot be read are reported
+    individually and do not fail the rest.
+    """
+    try:
+        model = initialize_gemini()
+        if not model:
+            return jsonify({"error": "Could not initialize Gemini API. Check API key."}), 500
+
+        try:
+            analysis_type = int(request.form.get('analysis_type', 3))
+        except ValueError:
+            analysis_type = 3
+
+        uploads = []
+        for file in request.files.getlist('files') + request.files.getlist('file'):
+            if file and file.filename != '':
+                filename = secure_filename(file.filename)
+                payload = file.read()
+                observe_upload(filename, len(payload))
+                uploads.append((filename, payload))
+
+        try:
+            files, skipped = expand_uploads(uploads)
+        except BatchError as e:
+            return jsonify({'error': str(e)}), 400
+
+        report = run_batch(files, analysis_type)
+        report['skipped'] = [{'filename': name, 'reason': reason} for name, reason in skipped]
+        if not report['summary']['succeeded']:
+            return jsonify(report), 400
+        return jsonify(report), 200
+
+    except Exception as e:
+        print(f"Error in analyze_batch: {e}")
+        traceback.print_exc()
+        return jsonify({"error": f"Server Error: {str(e)}"}), 500
+
+def _career_prompt(msg, mode):
+    if mode == 'roadmap':
+        return f"""Create a career roadmap for: "{msg}".
+        Format as Markdown:
+        ### 🎯 Phase 1: Start
+        * [Step]
+        ### 🚀 Phase 2: Grow
+        * [Step]
+        ### 🏆 Phase 3: Master
+        * [Step]
+        """
+    return f"""You are a helpful career counselor. 
+        User says: "{msg}". 
+        Reply encouragingly in under 100 words."""
+
 @app.route('/api/career-guide', methods=['POST'])
 def career_guide():
     try:
-        model = initialize_gemini()
-        if not model: return jsonify({"error": "API Key missing."}), 500
-        
         data = request.get_json()
         if not data: return jsonify({"error": "Invalid request"}), 400
 
@@ -102,26 +257,193 @@ def career_guide():
 
         if not msg: return jsonify({"error": "Message is empty"}), 400
 
-        if mode == 'roadmap':
-            prompt = f"""Create a career roadmap for: "{msg}".
-            Format as Markdown:
-            ### 🎯 Phase 1: Start
-            * [Step]
-            ### 🚀 Phase 2: Grow
-            * [Step]
-            ### 🏆 Phase 3: Master
-            * [Step]
-            """
-        else:
-            prompt = f"""You are a helpful career counselor. 
-            User says: "{msg}". 
-            Reply encouragingly in under 100 words."""
-
-        response = model.generate_content(prompt).text
+        response = generate_text(_career_prompt(msg, mode))
+        if response is None: return jsonify({"error": "API Key missing."}), 500
         return jsonify({"response": response}), 200
     except Exception as e:
         print(f"Career API Error: {e}")
         return jsonify({"error": f"Error: {str(e)}"}), 500
 
+@app.route('/api/career-guide/stream', methods=['POST'])
+def career_guide_stream():
+    data = request.get_json(silent=True)
+    if not data: return jsonify({"error": "Invalid request"}), 400
+
+    msg = data.get('message', '')
+    mode = data.get('mode', 'chat')
+
+    if not msg: return jsonify({"error": "Message is empty"}), 400
+    if not initialize_gemini(): return jsonify({"error": "API Key missing."}), 500
+
+    def events():
+        try:
+            for text in stream_text(_career_prompt(msg, mode)):
+                yield _sse('chunk', {'text': text})
+        except Exception as e:
+            print(f"Career API Error: {e}")
+            yield _sse('error', {'error': f"Error: {str(e)}"})
+        yield _sse('done', {})
+
+    return _event_stream(events())
+
+@app.route('/api/jobs', methods=['POST'])
+def create_job():
+    """Queues an analysis (same form fields as /api/analyze) and returns its id right away."""
+    try:
+        file = request.files.get('file')
+        text_input = request.form.get('text_input')
+
+        try:
+            analysis_type = int(request.form.get('analysis_type', 3))
+        except ValueError:
+            analysis_type = 3
+
+        queue = get_job_queue()
+        if file and file.filename != '':
+            filename = secure_filename(file.filename)
+            input_path = queue.upload_path(filename)
+            file.save(input_path)
+            observe_upload(filename, os.path.getsize(input_path))
+            job_id = queue.submit(analysis_type, input_path=input_path, filename=filename)
+        elif text_input:
+            job_id = queue.submit(analysis_type, input_text=text_input)
+        else:
+            return jsonify({'error': 'Please upload a file or enter text to analyze.'}), 400
+
+        return jsonify({"job_id": job_id, "status_url": f"/api/jobs/{job_id}"}), 202
+    except Exception as e:
+        print(f"Error in create_job: {e}")
+        traceback.print_exc()
+        return jsonify({"error": f"Server Error: {str(e)}"}), 500
+
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def job_status(job_id):
+    job = get_job_queue().get(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify(job), 200
+
+@app.route('/api/jobs/<job_id>', methods=['DELETE'])
+def cancel_job(job_id):
+    queue = get_job_queue()
+    if not queue.cancel(job_id):
+        if queue.get(job_id) is None:
+            return jsonify({"error": "Job not found"}), 404
+        return jsonify({"error": "Job has already finished"}), 409
+    return jsonify(queue.get(job_id)), 200
+
+def _upload_view(upload):
+    view = {key: upload[key] for key in ('id', 'filename', 'status', 'offset', 'total_bytes', 'job_id')}
+    if upload['job_id']:
+        view['status_url'] = f"/api/jobs/{upload['job_id']}"
+    return view
+
+def _submit_upload_job(store, upload):
+    """Starts the upload's analysis job unless a concurrent request already has. Returns the upload."""
+    job_id = uuid.uuid4().hex
+    if store.reserve_job(upload['id'], job_id):
+        get_job_queue().submit(upload['analysis_type'], input_path=upload['path'],
+                               filename=upload['filename'], upload_id=upload['id'], job_id=job_id)
+    return store.get(upload['id'])
+
+@app.route('/api/uploads', methods=['POST'])
+def create_upload():
+    """
+    Starts a chunked upload for files over MAX_CONTENT_LENGTH. JSON body:
+    filename, analysis_type, and optionally size (total bytes). Parts are then
+    PUT to /api/uploads/<id> with an Upload-Offset header, and the upload is
+    finished with POST /api/uploads/<id>/complete. CSV and TXT analysis jobs
+    start with the first part and parse parts as they arrive; other formats
+    start on completion. Results are polled from the job's status_url.
+    """
+    data = request.get_json(silent=True) or {}
+    filename = secure_filename(data.get('filename') or '')
+    if not filename:
+        return jsonify({'error': 'filename is required'}), 400
+    try:
+        analysis_type = int(data.get('analysis_type', 3))
+        total_bytes = int(data['size']) if data.get('size') is not None else None
+    except (TypeError, ValueError):
+        return jsonify({'error': 'analysis_type and size must be integers'}), 400
+
+    store = get_upload_store()
+    try:
+        upload = store.create(filename, analysis_type, total_bytes)
+    except UploadError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify(_upload_view(upload)), 201
+
+@app.route('/api/uploads/<upload_id>', methods=['GET'])
+def upload_status(upload_id):
+    """Where an interrupted upload should resume: its current offset."""
+    upload = get_upload_store().get(upload_id)
+    if upload is None:
+        return jsonify({"error": "Upload not found"}), 404
+    return jsonify(_upload_view(upload)), 200
+
+@app.route('/api/uploads/<upload_id>', methods=['PUT'])
+def upload_part(upload_id):
+    """Appends the raw request body at the Upload-Offset header's position."""
+    try:
+        offset = int(request.headers.get('Upload-Offset', ''))
+    except ValueError:
+        return jsonify({'error': 'Upload-Offset header is required'}), 400
+    store = get_upload_store()
+    try:
+        end = store.append(upload_id, offset, request.stream)
+    except OffsetMismatch as e:
+        return jsonify({'error': str(e), 'offset': e.offset}), 409
+    except UploadError as e:
+        return jsonify({'error': str(e)}), 409
+    if end is None:
+        return jsonify({"error": "Upload not found"}), 404
+    upload = store.get(upload_id)
+    # CSV and TXT are parsed while later parts arrive; an upload nobody sends to never holds a job slot
+    if not upload['job_id'] and os.path.splitext(upload['filename'])[1].lower() in STREAMABLE_EXTENSIONS:
+        upload = _submit_upload_job(store, upload)
+    return jsonify(_upload_view(upload)), 200
+
+@app.route('/api/uploads/<upload_id>/complete', methods=['POST'])
+def complete_upload(upload_id):
+    store = get_upload_store()
+    try:
+        upload = store.complete(upload_id)
+    except UploadError as e:
+        return jsonify({'error': str(e)}), 409
+    if upload is None:
+        return jsonify({"error": "Upload not found"}), 404
+    if not upload['job_id']:
+        upload = _submit_upload_job(store, upload)
+    observe_upload(upload['filename'], upload['offset'])
+    return jsonify(_upload_view(upload)), 202
+
+@app.route('/api/uploads/<upload_id>', methods=['DELETE'])
+def abort_upload(upload_id):
+    store = get_upload_store()
+    upload = store.get(upload_id)
+    if upload is None:
+        return jsonify({"error": "Upload not found"}), 404
+    if upload['job_id']:
+        get_job_queue().cancel(upload['job_id'])
+    store.abort(upload_id)
+    return jsonify({'id': upload_id, 'status': 'aborted'}), 200
+
+@app.route('/api/stats', methods=['GET'])
+def stats():
+    return jsonify({
+        "models": get_model_stats(),
+        "response_cache": get_cache_stats(),
+        "coalescing": get_coalescing_stats(),
+        "jobs": get_job_queue().stats(),
+        "uploads": get_upload_store().stats(),
+        "resilience": get_resilience_stats(),
+        "rate_limit": get_rate_limit_stats(),
+        "prompt_encoding": get_encoding_stats(),
+        "compaction": get_compaction_stats(),
+        "extraction_cache": get_extraction_cache_stats(),
+        "pdf": get_pdf_stats(),
+        "batch": get_batch_stats(),
+    }), 200
+
 if __name__ == '__main__':
     app.run(debug=True)
\ No newline at end of file
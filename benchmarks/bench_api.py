@@ -0,0 +1,342 @@
+"""
+End-to-end throughput benchmark for /api/analyze and /api/career-guide.
+
+Drives the Flask app in-process (test client, one thread per concurrent
+client) with synthetic gradebooks in CSV, XLSX, PDF and TXT form, against the
+offline fake model backend, so no network or quota is used.
+
+    python benchmarks/bench_api.py
+    python benchmarks/bench_api.py --rows 10 1000 100000 --formats csv xlsx --requests 50 --concurrency 8
+    python benchmarks/bench_api.py --compare outputs/benchmarks/previous.json --max-regression 0.2
+
+Reports p50/p95/p99 latency, requests/sec, peak RSS and a per-stage time
+breakdown (taken from the app's Server-Timing headers) for each scenario,
+and writes everything as JSON. Each scenario rotates through --variants
+distinct gradebooks (and career prompts), so concurrent requests are not
+coalesced into one model call, and RSS is sampled while the scenario runs
+so its peak is that scenario's rather than the run's so far.
+"""
+import os
+import io
+import sys
+import json
+import time
+import resource
+import argparse
+import threading
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from gradebooks import make_gradebook
+
+FORMATS = ['csv', 'xlsx', 'pdf', 'txt']
+PDF_LINES_PER_PAGE = 60
+
+# --- Synthetic inputs ---
+
+def _gradebook_lines(df):
+    return [
+        f"{r.student_name} ({r['class']}): math {r.math_score}, science {r.science_score}, "
+        f"english {r.english_score}, attendance {r.attendance}%"
+        for _, r in df.iterrows()
+    ]
+
+def _pdf_bytes(lines):
+    """Minimal multi-page PDF with one Helvetica text line per row."""
+    pages = [lines[i:i + PDF_LINES_PER_PAGE] for i in range(0, len(lines), PDF_LINES_PER_PAGE)] or [[]]
+    objects = ["<< /Type /Catalog /Pages 2 0 R >>", None, "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    kids = []
+    for page_lines in pages:
+        text = "".join(
+            f"({line.replace(chr(92), '').replace('(', '').replace(')', '')}) Tj T* " for line in page_lines
+        )
+        stream = f"BT /F1 9 Tf 11 TL 40 780 Td {text}ET"
+        objects.append(f"<< /Length {len(stream)} >>\nstream\n{stream}\nendstream")
+        content_id = len(objects)
+        objects.append(
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+            f"/Resources << /Font << /F1 3 0 R >> >> /Contents {content_id} 0 R >>"
+        )
+        kids.append(f"{len(objects)} 0 R")
+    objects[1] = f"<< /Type /Pages /Kids [{' '.join(kids)}] /Count {len(kids)} >>"
+
+    out = io.BytesIO()
+    out.write(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(out.tell())
+        out.write(f"{number} 0 obj\n{body}\nendobj\n".encode('latin-1'))
+    xref = out.tell()
+    out.write(f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode('latin-1'))
+    for offset in offsets:
+        out.write(f"{offset:010d} 00000 n \n".encode('latin-1'))
+    out.write(f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode('latin-1'))
+    return out.getvalue()
+
+def make_upload(fmt, rows, seed=0):
+    """Returns (filename, bytes) for a synthetic gradebook in the given format."""
+    df = make_gradebook(rows, seed=seed)
+    if fmt == 'csv':
+        return 'gradebook.csv', df.to_csv(index=False).encode('utf-8')
+    if fmt == 'xlsx':
+        buffer = io.BytesIO()
+        df.to_excel(buffer, index=False, engine='openpyxl')
+        return 'gradebook.xlsx', buffer.getvalue()
+    if fmt == 'txt':
+        return 'gradebook.txt', "\n".join(_gradebook_lines(df)).encode('utf-8')
+    if fmt == 'pdf':
+        return 'gradebook.pdf', _pdf_bytes(_gradebook_lines(df))
+    raise ValueError(fmt)
+
+# --- Stage breakdown (from the app's Server-Timing header) ---
+
+class StageTimer:
+    """Sums the per-stage durations reported in each response's Server-Timing header."""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.totals = defaultdict(float)
+        self.counts = defaultdict(int)
+
+    def record(self, header):
+        for entry in filter(None, (part.strip() for part in (header or '').split(','))):
+            name, *params = entry.split(';')
+            duration = next((float(p[4:]) for p in params if p.startswith('dur=')), None)
+            calls = next((int(p[6:].strip('"').split()[0]) for p in params if p.startswith('desc=')), 1)
+            if name == 'total' or duration is None:
+                continue
+            with self._lock:
+                self.totals[name] += duration / 1000
+                self.counts[name] += calls
+
+    def reset(self):
+        with self._lock:
+            self.totals.clear()
+            self.counts.clear()
+
+    def snapshot(self, requests):
+        with self._lock:
+            return {
+                stage: {
+                    'calls': self.counts[stage],
+                    'total_seconds': round(total, 4),
+                    'mean_ms_per_request': round(1000 * total / max(1, requests), 3),
+                }
+                for stage, total in sorted(self.totals.items())
+            }
+
+# --- Load generation ---
+
+def percentile(values, pct):
+    return float(np.percentile(values, pct)) if values else None
+
+def peak_rss_mb():
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+def current_rss_mb():
+    """Resident memory now, from /proc (Linux); None elsewhere."""
+    try:
+        with open('/proc/self/statm') as f:
+            pages = int(f.read().split()[1])
+    except (OSError, IndexError, ValueError):
+        return None
+    return pages * os.sysconf('SC_PAGE_SIZE') / (1024 * 1024)
+
+class RssSampler:
+    """
+    Samples resident memory on a background thread while a scenario runs.
+    Without /proc it reports the process-wide ru_maxrss, which only ever grows.
+    """
+    def __init__(self, interval=0.01):
+        self.interval = interval
+        self.start = self.peak = current_rss_mb()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+
+    def _sample(self):
+        while not self._stop.wait(self.interval):
+            rss = current_rss_mb()
+            if rss is not None:
+                self.peak = max(self.peak, rss)
+
+    def __enter__(self):
+        if self.start is not None:
+            self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        if self.start is None:
+            self.peak = peak_rss_mb()
+            return
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, current_rss_mb() or 0)
+
+def coalesced_count():
+    from modules.gemini_analyzer import get_coalescing_stats
+    return get_coalescing_stats()['coalesced_waiters']
+
+def run_scenario(client, timer, name, send, requests, concurrency):
+    timer.reset()
+    latencies = []
+    statuses = defaultdict(int)
+    lock = threading.Lock()
+
+    def one(index):
+        start = time.perf_counter()
+        response = send(client, index)
+        elapsed = time.perf_counter() - start
+        status = response.status_code
+        timer.record(response.headers.get('Server-Timing'))
+        with lock:
+            latencies.append(elapsed)
+            statuses[status] += 1
+
+    coalesced = coalesced_count()
+    started = time.perf_counter()
+    with RssSampler() as rss, ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(one, range(requests)))
+    wall = time.perf_counter() - started
+
+    result = {
+        'scenario': name,
+        'requests': requests,
+        'concurrency': concurrency,
+        'statuses': {str(k): v for k, v in statuses.items()},
+        'wall_seconds': round(wall, 4),
+        'requests_per_second': round(requests / wall, 3) if wall else None,
+        'latency_ms': {
+            'p50': round(1000 * percentile(latencies, 50), 2),
+            'p95': round(1000 * percentile(latencies, 95), 2),
+            'p99': round(1000 * percentile(latencies, 99), 2),
+            'max': round(1000 * max(latencies), 2),
+        },
+        'start_rss_mb': round(rss.start, 1) if rss.start is not None else None,
+        'peak_rss_mb': round(rss.peak, 1),
+        'coalesced_requests': coalesced_count() - coalesced,
+        'stages': timer.snapshot(requests),
+    }
+    print(
+        f"{name:<28} {result['requests_per_second']:>8.2f} req/s  "
+        f"p50 {result['latency_ms']['p50']:>9.1f}ms  p95 {result['latency_ms']['p95']:>9.1f}ms  "
+        f"p99 {result['latency_ms']['p99']:>9.1f}ms  rss {result['peak_rss_mb']:>7.1f}MB  {dict(statuses)}"
+    )
+    return result
+
+def analyze_sender(filename, payloads, analysis_type):
+    def send(client, index):
+        response = client.post('/api/analyze', data={
+            'analysis_type': str(analysis_type),
+            'file': (io.BytesIO(payloads[index % len(payloads)]), filename),
+        }, content_type='multipart/form-data')
+        return response
+    return send
+
+CAREER_ROLES = ['Data Scientist', 'Nurse', 'Civil Engineer', 'Graphic Designer', 'Teacher', 'Electrician']
+
+def career_sender(mode, variants):
+    def send(client, index):
+        variant = index % variants
+        message = f"{CAREER_ROLES[variant % len(CAREER_ROLES)]} (student {variant})"
+        return client.post('/api/career-guide', json={'message': message, 'mode': mode})
+    return send
+
+def compare(current, baseline_path, max_regression):
+    """Prints p95/throughput deltas against a previous run; returns False on regression."""
+    with open(baseline_path, encoding='utf-8') as f:
+        baseline = {r['scenario']: r for r in json.load(f)['results']}
+    ok = True
+    print(f"\nComparison with {baseline_path}:")
+    for result in current:
+        before = baseline.get(result['scenario'])
+        if not before:
+            continue
+        p95_change = result['latency_ms']['p95'] / before['latency_ms']['p95'] - 1
+        rps_change = result['requests_per_second'] / before['requests_per_second'] - 1
+        regressed = p95_change > max_regression or rps_change < -max_regression
+        ok = ok and not regressed
+        print(f"  {result['scenario']:<28} p95 {p95_change:+.1%}  req/s {rps_change:+.1%}"
+              f"{'  REGRESSION' if regressed else ''}")
+    return ok
+
+def main():
+    parser = argparse.ArgumentParser(description="Throughput benchmark for the Flask API (offline model).")
+    parser.add_argument('--rows', type=int, nargs='+', default=[10, 1000, 100000],
+                        help='gradebook sizes, 10 to 1,000,000 rows')
+    parser.add_argument('--formats', nargs='+', choices=FORMATS, default=FORMATS)
+    parser.add_argument('--analysis-type', type=int, default=3, choices=[1, 2, 3, 4])
+    parser.add_argument('--requests', type=int, default=20, help='requests per scenario')
+    parser.add_argument('--concurrency', type=int, default=4)
+    parser.add_argument('--variants', type=int, default=None,
+                        help='distinct gradebooks/prompts per scenario (default: --concurrency)')
+    parser.add_argument('--latency', default='fixed:0.05', help='FAKE_LATENCY for the stub model')
+    parser.add_argument('--with-cache', action='store_true', help='keep the response and extraction caches enabled')
+    parser.add_argument('--max-upload-mb', type=float, default=None,
+                        help='override MAX_CONTENT_LENGTH (default: unlimited for the benchmark)')
+    parser.add_argument('--output', help='JSON results path (default: outputs/benchmarks/bench_api_<timestamp>.json)')
+    parser.add_argument('--compare', help='previous JSON results to compare against')
+    parser.add_argument('--max-regression', type=float, default=0.2)
+    args = parser.parse_args()
+
+    # Configure the stub before the app (and its module-level settings) is imported
+    os.environ['ANALYZER_MODEL_BACKEND'] = 'fake'
+    os.environ['FAKE_LATENCY'] = args.latency
+    os.environ.setdefault('GEMINI_RPM', '0')
+    os.environ.setdefault('GEMINI_TPM', '0')
+    os.environ['TRACING_ENABLED'] = '1'
+    if not args.with_cache:
+        # Every request re-sends the same upload, so either cache would skip the work being measured
+        os.environ['RESPONSE_CACHE_ENABLED'] = '0'
+        os.environ['EXTRACT_CACHE_ENABLED'] = '0'
+
+    import app as app_module
+    flask_app = app_module.app
+    flask_app.config['MAX_CONTENT_LENGTH'] = int(args.max_upload_mb * 1024 * 1024) if args.max_upload_mb else None
+    timer = StageTimer()
+    client = flask_app.test_client()
+    variants = max(1, args.variants or args.concurrency)
+
+    results = []
+    for fmt in args.formats:
+        for rows in args.rows:
+            start = time.perf_counter()
+            uploads = [make_upload(fmt, rows, seed) for seed in range(variants)]
+            filename = uploads[0][0]
+            payloads = [payload for _, payload in uploads]
+            del uploads
+            print(f"\n{fmt.upper()} {rows:,} rows: {variants} x {len(payloads[0]) / 1e6:.2f} MB generated "
+                  f"in {time.perf_counter() - start:.1f}s")
+            result = run_scenario(client, timer, f"analyze/{fmt}/{rows}",
+                                  analyze_sender(filename, payloads, args.analysis_type),
+                                  args.requests, args.concurrency)
+            result.update({'format': fmt, 'rows': rows, 'upload_bytes': len(payloads[0]), 'variants': variants})
+            results.append(result)
+            del payloads
+
+    print()
+    for mode in ['chat', 'roadmap']:
+        results.append(run_scenario(client, timer, f"career-guide/{mode}", career_sender(mode, variants),
+                                    args.requests, args.concurrency))
+
+    output = args.output or os.path.join(
+        'outputs', 'benchmarks', f"bench_api_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+    os.makedirs(os.path.dirname(output) or '.', exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump({
+            'created': datetime.now().isoformat(timespec='seconds'),
+            'config': vars(args),
+            'results': results,
+        }, f, indent=2)
+    print(f"\nResults written to {output}")
+
+    if args.compare and not compare(results, args.compare, args.max_regression):
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,77 @@
+"""
+Compares CSV ingestion through the pyarrow engine (Arrow dtypes, compact
+numerics) with the C engine path, on wide synthetic gradebooks.
+
+    python benchmarks/bench_csv_engines.py
+    python benchmarks/bench_csv_engines.py --rows 100000 1000000 --subjects 40 --json results.json
+
+Memory is the resulting frame's deep memory_usage(); both paths are timed
+through data_extractor._read_csv with CSV_ENGINE switched.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from modules import data_extractor
+from modules.data_extractor import get_chart_data
+from gradebooks import make_gradebook
+
+def run(engine, path, repeat):
+    data_extractor.CSV_ENGINE = engine
+    best = float('inf')
+    df = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        df = data_extractor._read_csv(path)
+        best = min(best, time.perf_counter() - start)
+    return best, df
+
+def main():
+    parser = argparse.ArgumentParser(description="pyarrow vs C engine CSV ingestion.")
+    parser.add_argument('--rows', type=int, nargs='+', default=[100000, 500000])
+    parser.add_argument('--subjects', type=int, default=20, help='score columns per row')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--json', help='write results to this file')
+    args = parser.parse_args()
+
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        print("pyarrow is not installed; the 'pyarrow' rows below use the C engine fallback.")
+
+    results = []
+    print(f"{'rows':>9} {'MB':>7} {'engine':>8} {'parse s':>9} {'frame MB':>9} {'speedup':>8} {'smaller':>8}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for rows in args.rows:
+            path = os.path.join(tmp, 'gradebook.csv')
+            make_gradebook(rows, args.subjects).to_csv(path, index=False)
+            size = os.path.getsize(path)
+            baseline = None
+            charts = {}
+            for engine in ['c', 'pyarrow']:
+                seconds, df = run(engine, path, args.repeat)
+                memory = int(df.memory_usage(deep=True).sum())
+                baseline = baseline or (seconds, memory)
+                charts[engine] = get_chart_data(df)
+                results.append({
+                    'rows': rows, 'file_bytes': size, 'engine': engine,
+                    'parse_seconds': round(seconds, 4), 'frame_bytes': memory,
+                    'dtypes': sorted({str(t) for t in df.dtypes}),
+                })
+                print(f"{rows:>9} {size / 1e6:>7.1f} {engine:>8} {seconds:>9.3f} {memory / 1e6:>9.1f} "
+                      f"{baseline[0] / seconds:>7.2f}x {baseline[1] / memory:>7.2f}x")
+            if charts['c'] != charts['pyarrow']:
+                print("  warning: chart data differs between engines")
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+        print(f"\nResults written to {args.json}")
+
+if __name__ == '__main__':
+    main()
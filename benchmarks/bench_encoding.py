@@ -0,0 +1,137 @@
+"""
+Compares the single-pass encoding sniffer in data_extractor against the old
+try-each-encoding loop, on large cp1252 and BOM-less UTF-16 gradebooks (CSV
+and TXT).
+
+    python benchmarks/bench_encoding.py
+    python benchmarks/bench_encoding.py --mb 10 100 --json results.json
+
+The first non-UTF-8 byte is placed either near the start or near the end of
+the file; the old loop only notices it when it gets there, so "late" files
+cost it a nearly complete wasted pass. Bytes read come from /proc/self/io
+(Linux), so "passes" counts every read including the page cache. "decoded"
+says whether the accented name came back intact; UTF-16 without a BOM is
+also valid UTF-8 when its text is ASCII, so only NUL-aware sniffing gets it.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from modules.data_extractor import _read_csv, _read_text
+
+LEGACY_ENCODINGS = ['utf-8', 'latin-1', 'iso-8859-1', 'cp1252']
+
+def legacy_read_csv(file_path):
+    for encoding in LEGACY_ENCODINGS:
+        try:
+            return pd.read_csv(file_path, encoding=encoding)
+        except UnicodeDecodeError:
+            continue
+
+def legacy_read_text(file_path):
+    for encoding in LEGACY_ENCODINGS:
+        try:
+            with open(file_path, 'r', encoding=encoding) as f:
+                return f.read()
+        except UnicodeDecodeError:
+            continue
+
+ACCENTED_NAME = "Zoë O’Brien"
+# (where the accented name goes, file encoding)
+CASES = [('early', 'cp1252'), ('late', 'cp1252'), ('early', 'utf-16-le')]
+
+def make_file(path, megabytes, fmt, accent_at, encoding='cp1252', seed=0):
+    """Gradebook of roughly `megabytes` of ASCII text with one accented name at the start or end."""
+    rng = np.random.default_rng(seed)
+    rows = int(megabytes * 1e6 / 40)
+    df = pd.DataFrame({
+        'student_name': [f"Student {i}" for i in range(rows)],
+        'math_score': rng.integers(30, 100, rows),
+        'science_score': rng.integers(30, 100, rows),
+        'attendance': rng.uniform(60, 100, rows).round(1),
+    })
+    df.loc[0 if accent_at == 'early' else rows - 1, 'student_name'] = ACCENTED_NAME
+    if fmt == 'csv':
+        text = df.to_csv(index=False)
+    else:
+        text = "\n".join(f"{r.student_name}: math {r.math_score}, attendance {r.attendance}%"
+                         for r in df.itertuples())
+    with open(path, 'w', encoding=encoding, newline='') as f:
+        f.write(text)
+    return os.path.getsize(path)
+
+def bytes_read():
+    try:
+        with open('/proc/self/io') as f:
+            return int(next(line for line in f if line.startswith('rchar:')).split()[1])
+    except (OSError, StopIteration):
+        return None
+
+def decoded(result):
+    if result is None:
+        return False
+    text = result if isinstance(result, str) else result.to_csv(index=False)
+    return ACCENTED_NAME in text
+
+def measure(func, path, repeat):
+    best = float('inf')
+    read = None
+    result = None
+    for _ in range(repeat):
+        before = bytes_read()
+        start = time.perf_counter()
+        result = func(path)
+        best = min(best, time.perf_counter() - start)
+        after = bytes_read()
+        read = after - before if before is not None else None
+    return best, read, decoded(result)
+
+def main():
+    parser = argparse.ArgumentParser(description="Single-pass encoding detection vs the old retry loop.")
+    parser.add_argument('--mb', type=float, nargs='+', default=[10, 50], help='file sizes in MB')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--json', help='write results to this file')
+    args = parser.parse_args()
+
+    readers = {
+        'csv': {'legacy': legacy_read_csv, 'sniffed': _read_csv},
+        'txt': {'legacy': legacy_read_text, 'sniffed': _read_text},
+    }
+    results = []
+    print(f"{'fmt':>4} {'MB':>6} {'encoding':>9} {'accent':>7} {'reader':>8} {'seconds':>9} {'passes':>7} "
+          f"{'speedup':>8} {'decoded':>8}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for fmt, pair in readers.items():
+            for megabytes in args.mb:
+                for accent_at, encoding in CASES:
+                    path = os.path.join(tmp, f"gradebook.{fmt}")
+                    size = make_file(path, megabytes, fmt, accent_at, encoding)
+                    baseline = None
+                    for name, func in pair.items():
+                        seconds, read, ok = measure(func, path, args.repeat)
+                        baseline = baseline or seconds
+                        passes = read / size if read is not None else None
+                        results.append({
+                            'format': fmt, 'bytes': size, 'encoding': encoding, 'accent_at': accent_at,
+                            'reader': name, 'seconds': round(seconds, 4),
+                            'passes': round(passes, 2) if passes is not None else None,
+                            'decoded': ok,
+                        })
+                        shown = f"{passes:7.2f}" if passes is not None else f"{'-':>7}"
+                        print(f"{fmt:>4} {size / 1e6:>6.1f} {encoding:>9} {accent_at:>7} {name:>8} {seconds:>9.3f} "
+                              f"{shown} {baseline / seconds:>7.2f}x {'yes' if ok else 'no':>8}")
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+        print(f"\nResults written to {args.json}")
+
+if __name__ == '__main__':
+    main()
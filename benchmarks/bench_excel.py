@@ -0,0 +1,112 @@
+"""
+Compares Excel ingestion paths on a large multi-sheet gradebook workbook:
+the old full-load pd.read_excel(engine='openpyxl'), the streaming reader
+over read-only openpyxl, and the streaming reader over python-calamine.
+
+    python benchmarks/bench_excel.py                 # ~50 MB workbook
+    python benchmarks/bench_excel.py --mb 10 --sheets 4 --json results.json
+
+Each path runs in a fresh process so peak RSS is its own. The old path reads
+only the first sheet, so it is compared on 'first'; the streaming readers
+are also timed on 'all'.
+"""
+import os
+import sys
+import json
+import time
+import resource
+import argparse
+import tempfile
+import multiprocessing
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+CALIBRATION_ROWS = 20000
+
+def write_workbook(path, rows_per_sheet, sheets, seed=0):
+    from openpyxl import Workbook
+    rng = np.random.default_rng(seed)
+    workbook = Workbook(write_only=True)
+    for s in range(sheets):
+        sheet = workbook.create_sheet(f"Class {s + 1}")
+        sheet.append(['Student ID', 'Student Name', 'Math Score', 'Science Score', 'English Score',
+                      'History Score', 'Art Score', 'Attendance', 'Comments'])
+        scores = rng.integers(30, 100, (rows_per_sheet, 5))
+        attendance = rng.uniform(60, 100, rows_per_sheet).round(1)
+        for i in range(rows_per_sheet):
+            sheet.append([i + 1, f"Student {s}-{i}", *scores[i].tolist(), float(attendance[i]),
+                          'Needs support' if scores[i, 0] < 50 else 'On track'])
+    workbook.save(path)
+    return os.path.getsize(path)
+
+def make_workbook(path, megabytes, sheets):
+    """Writes a workbook of roughly `megabytes`, scaling from a small calibration file."""
+    sample_size = write_workbook(path, CALIBRATION_ROWS // sheets, sheets)
+    rows = int(CALIBRATION_ROWS * megabytes * 1e6 / sample_size)
+    return write_workbook(path, max(1, rows // sheets), sheets), rows
+
+def _child(path, variant, sheets, queue):
+    import pandas as pd
+    from modules import data_extractor
+    start = time.perf_counter()
+    if variant == 'full-load':
+        df = pd.read_excel(path, engine='openpyxl')
+    else:
+        data_extractor.EXCEL_ENGINE = variant
+        df = data_extractor._read_excel(path, sheets)
+    seconds = time.perf_counter() - start
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    peak_mb = peak / (1024 * 1024 if sys.platform == 'darwin' else 1024)
+    queue.put({'seconds': seconds, 'peak_rss_mb': round(peak_mb, 1), 'rows': len(df) if df is not None else None})
+
+def run(path, variant, sheets):
+    context = multiprocessing.get_context('spawn')
+    queue = context.Queue()
+    process = context.Process(target=_child, args=(path, variant, sheets, queue))
+    process.start()
+    result = queue.get()
+    process.join()
+    return result
+
+def main():
+    parser = argparse.ArgumentParser(description="Streaming vs full-load Excel ingestion.")
+    parser.add_argument('--mb', type=float, default=50, help='approximate workbook size')
+    parser.add_argument('--sheets', type=int, default=4)
+    parser.add_argument('--json', help='write results to this file')
+    args = parser.parse_args()
+
+    try:
+        import python_calamine  # noqa: F401
+        variants = ['full-load', 'openpyxl', 'calamine']
+    except ImportError:
+        print("python-calamine is not installed; skipping the calamine engine.")
+        variants = ['full-load', 'openpyxl']
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'gradebook.xlsx')
+        start = time.perf_counter()
+        size, rows = make_workbook(path, args.mb, args.sheets)
+        print(f"{size / 1e6:.1f} MB workbook, {rows:,} rows in {args.sheets} sheets "
+              f"(written in {time.perf_counter() - start:.0f}s)\n")
+        print(f"{'reader':>10} {'sheets':>7} {'rows':>10} {'seconds':>9} {'peak MB':>8} {'speedup':>8}")
+        baseline = None
+        for sheets in ['first', 'all']:
+            for variant in variants:
+                if variant == 'full-load' and sheets != 'first':
+                    continue
+                result = run(path, variant, sheets)
+                baseline = baseline or result['seconds']
+                result.update({'reader': variant, 'sheets': sheets, 'file_bytes': size})
+                results.append(result)
+                print(f"{variant:>10} {sheets:>7} {result['rows']:>10,} {result['seconds']:>9.2f} "
+                      f"{result['peak_rss_mb']:>8.1f} {baseline / result['seconds']:>7.2f}x")
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+        print(f"\nResults written to {args.json}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,74 @@
+"""
+Compares prompt size and build time of the compact encodings against the
+legacy DataFrame.to_string() path, on synthetic gradebooks.
+
+    python benchmarks/bench_prompt_encoding.py
+    python benchmarks/bench_prompt_encoding.py --rows 50 500 5000 --json results.json
+    python benchmarks/bench_prompt_encoding.py --live   # also time real Gemini calls (uses quota)
+"""
+import os
+import sys
+import json
+import time
+import argparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from modules.prompt_encoding import encode_dataframe
+from modules.rate_limiter import estimate_tokens
+from gradebooks import make_gradebook
+
+FORMATS = ['text', 'csv', 'tsv', 'columns']
+
+def time_call(func, repeat=5):
+    best = float('inf')
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+def live_latency(prompt):
+    from modules.gemini_analyzer import initialize_gemini
+    model = initialize_gemini()
+    if not model:
+        return None
+    start = time.perf_counter()
+    model.generate_content(prompt)
+    return time.perf_counter() - start
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=int, nargs='+', default=[50, 500, 5000])
+    parser.add_argument('--live', action='store_true', help='send each prompt to Gemini and time it')
+    parser.add_argument('--json', help='write results to this file')
+    args = parser.parse_args()
+
+    results = []
+    print(f"{'rows':>7} {'format':>8} {'tokens':>9} {'saved':>7} {'build ms':>9} {'live s':>7}")
+    for rows in args.rows:
+        df = make_gradebook(rows, float_scores=True, school='Central High')
+        baseline_tokens = None
+        for fmt in FORMATS:
+            seconds, text = time_call(lambda: encode_dataframe(df, fmt=fmt))
+            tokens = estimate_tokens(text)
+            if fmt == 'text':
+                baseline_tokens = tokens
+            latency = live_latency(f"Summarise this class in one line.\n{text}") if args.live else None
+            saved = 1 - tokens / baseline_tokens
+            results.append({
+                'rows': rows, 'format': fmt, 'tokens': tokens, 'chars': len(text),
+                'savings_ratio': round(saved, 4), 'build_seconds': round(seconds, 6),
+                'live_seconds': round(latency, 3) if latency is not None else None,
+            })
+            live = f"{latency:7.2f}" if latency is not None else f"{'-':>7}"
+            print(f"{rows:>7} {fmt:>8} {tokens:>9} {saved:>6.0%} {seconds * 1000:>9.2f} {live}")
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+        print(f"\nResults written to {args.json}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,37 @@
+"""
+Synthetic gradebooks shared by the benchmarks. Scripts in this folder import
+it as a sibling module (python puts the script's own folder on sys.path).
+"""
+import numpy as np
+import pandas as pd
+
+SUBJECTS = ['math', 'science', 'english']
+CLASSES = ['9A', '9B', '10A', '10B']
+
+def make_gradebook(rows, subjects=3, seed=0, float_scores=False, school=None):
+    """
+    student_id, student_name, class, one <subject>_score column per subject
+    (math, science, english, then subject_<i>) and attendance.
+
+    Scores are whole numbers from 30 to 100 and attendance has one decimal,
+    unless float_scores, which draws unrounded normally distributed scores
+    and attendance (floats as a spreadsheet export would carry them).
+    school adds a constant column with that value.
+    """
+    rng = np.random.default_rng(seed)
+    columns = {
+        'student_id': np.arange(1, rows + 1),
+        'student_name': [f"Student {i}" for i in range(rows)],
+    }
+    if school is not None:
+        columns['school'] = school
+    columns['class'] = rng.choice(CLASSES, rows)
+    for i in range(subjects):
+        name = f"{SUBJECTS[i]}_score" if i < len(SUBJECTS) else f"subject_{i}_score"
+        if float_scores:
+            columns[name] = rng.normal(70, 13, rows).clip(0, 100)
+        else:
+            columns[name] = rng.integers(30, 101, rows)
+    attendance = rng.uniform(60, 100, rows)
+    columns['attendance'] = attendance if float_scores else attendance.round(1)
+    return pd.DataFrame(columns)
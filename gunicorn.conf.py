@@ -0,0 +1,10 @@
+# Picked up automatically by `gunicorn app:app` (see Procfile).
+# Only the metrics hooks live here; pass other settings on the command line.
+from modules.metrics import reset_multiprocess_dir, mark_process_dead
+
+def on_starting(server):
+    # PROMETHEUS_MULTIPROC_DIR must not carry samples over from a previous run
+    reset_multiprocess_dir()
+
+def child_exit(server, worker):
+    mark_process_dead(worker.pid)
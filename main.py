@@ -1,9 +1,23 @@
 import os
 import sys
+import glob
+import json
+import time
+import hashlib
+import argparse
+import threading
 from datetime import datetime
-from modules.data_extractor import read_data
-from modules.gemini_analyzer import analyze_student_data, generate_comparative_analysis
-from modules.report_generator import save_analysis_report
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from modules.data_extractor import read_data, COMPACT_DATAFRAMES, CSV_ENGINE
+from modules.gemini_analyzer import (analyze_student_data, generate_comparative_analysis, run_analyses,
+                                     build_analysis_tasks, initialize_gemini, PROMPT_VERSION, ANALYSIS_WORKERS,
+                                     SHARD_TOKEN_BUDGET)
+from modules.prompt_encoding import PROMPT_FORMAT, PROMPT_FLOAT_PRECISION
+from modules.report_generator import save_analysis_report, REPORT_FORMATS
+
+SUPPORTED_EXTENSIONS = ('.xlsx', '.xls', '.csv', '.txt', '.pdf')
+# Batch mode remembers what it analysed so unchanged files are skipped next run
+MANIFEST_PATH = os.path.join('outputs', 'reports', 'manifest.json')
 
 def display_banner():
     """Display application banner with version info."""
@@ -85,7 +99,180 @@ def display_analysis_options():
             return int(choice)
         print("❌ Invalid choice. Please enter 1, 2, or 3.")
 
-def main():
+def print_shard_progress(done, total):
+    """Progress callback for sharded individual analysis."""
+    if total > 1:
+        print(f"   ↳ {done}/{total} roster shards analysed")
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Student Performance Analyzer. Without options it asks for a file interactively; "
+                    "with --input-dir or --glob it analyses every matching file unattended (e.g. from cron).")
+    parser.add_argument('--input-dir', help="folder of gradebooks to analyse (batch mode; default 'data')")
+    parser.add_argument('--glob', help="filename pattern inside the folder (batch mode; default '*')")
+    parser.add_argument('--analysis', type=int, choices=[1, 2, 3], default=3,
+                        help="1 individual, 2 comparative, 3 both (default)")
+    parser.add_argument('--workers', type=int, default=ANALYSIS_WORKERS,
+                        help=f"files analysed at once, at most ANALYSIS_WORKERS (default {ANALYSIS_WORKERS})")
+    parser.add_argument('--output-format', choices=REPORT_FORMATS, default='txt', help="report format (default txt)")
+    parser.add_argument('--force', action='store_true', help="re-analyse files that are unchanged since the last run")
+    parser.add_argument('--manifest', default=MANIFEST_PATH, help=f"where skip state is kept (default {MANIFEST_PATH})")
+    return parser.parse_args(argv)
+
+def prompt_fingerprint(model, analysis_type, output_format):
+    """
+    Identifies everything besides the file that shapes its report: the model
+    and backend actually in use, the prompt templates, and the settings that
+    change what data reaches the prompt.
+    """
+    settings = json.dumps({
+        'prompt_version': PROMPT_VERSION, 'prompt_format': PROMPT_FORMAT,
+        'float_precision': PROMPT_FLOAT_PRECISION, 'shard_token_budget': SHARD_TOKEN_BUDGET,
+        'compact_dataframes': COMPACT_DATAFRAMES, 'csv_engine': CSV_ENGINE,
+        'analysis': analysis_type, 'output_format': output_format,
+    }, sort_keys=True)
+    backend = os.getenv("ANALYZER_MODEL_BACKEND", "gemini")
+    return f"{backend}:{model.model_name}:{hashlib.sha256(settings.encode('utf-8')).hexdigest()[:16]}"
+
+def file_digest(file_path):
+    """SHA-256 of a file's bytes."""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+class Manifest:
+    """
+    Content hash and prompt fingerprint of each file's last successful report,
+    kept as JSON. Saved after every file, so an interrupted run keeps its progress.
+    """
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        try:
+            with open(path, encoding='utf-8') as f:
+                self._entries = json.load(f)
+        except (OSError, ValueError):
+            self._entries = {}
+
+    def unchanged(self, file_path, digest, fingerprint):
+        entry = self._entries.get(os.path.abspath(file_path))
+        return bool(entry and entry['sha256'] == digest and entry['prompt'] == fingerprint
+                    and entry.get('report') and os.path.exists(entry['report']))
+
+    def record(self, file_path, digest, fingerprint, report_path):
+        with self._lock:
+            self._entries[os.path.abspath(file_path)] = {
+                'sha256': digest, 'prompt': fingerprint, 'report': report_path,
+                'analysed': datetime.now().isoformat(timespec='seconds'),
+            }
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            temp_path = f"{self.path}.tmp"
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                json.dump(self._entries, f, indent=2)
+            os.replace(temp_path, self.path)
+
+def analyse_file(file_path, analysis_type, output_format, manifest, fingerprint, force=False):
+    """
+    Batch-mode worker for one file: skip if unchanged, else read, analyse and
+    save the report.
+
+    Returns:
+        dict: status ('skipped' or 'done'), bytes, parse_seconds, report
+    Raises:
+        ValueError: the file could not be read or every analysis failed
+    """
+    file_name = os.path.basename(file_path)
+    digest = file_digest(file_path)
+    size = os.path.getsize(file_path)
+    if not force and manifest.unchanged(file_path, digest, fingerprint):
+        return {'status': 'skipped', 'bytes': size, 'parse_seconds': 0.0, 'report': None}
+
+    start = time.perf_counter()
+    student_data = read_data(file_path, stats_only=analysis_type == 2)
+    parse_seconds = time.perf_counter() - start
+    if student_data is None or (isinstance(student_data, str) and student_data.startswith("Error")):
+        raise ValueError(student_data or "Data reading failed")
+
+    tasks, results = build_analysis_tasks(student_data, analysis_type)
+    results.update(run_analyses(tasks))
+    failed = [key for key, text in results.items() if text.startswith("Error")]
+
+    report_path = save_analysis_report(file_name, results, output_format)
+    if report_path is None:
+        raise ValueError("Report could not be saved")
+    if failed:
+        # The report is kept for inspection, but the file is not marked done so the next run retries it
+        raise ValueError(f"{', '.join(failed)} analysis failed: {results[failed[0]]}")
+    manifest.record(file_path, digest, fingerprint, report_path)
+    return {'status': 'done', 'bytes': size, 'parse_seconds': parse_seconds, 'report': report_path}
+
+def run_batch(args):
+    """Non-interactive mode: analyses every matching file concurrently. Returns the exit code."""
+    display_banner()
+    setup_directories()
+
+    model = initialize_gemini()
+    if not model:
+        print("\n❌ Could not initialize Gemini API. Check GOOGLE_API_KEY.")
+        return 1
+
+    pattern = os.path.join(args.input_dir or 'data', args.glob or '*')
+    paths = sorted(path for path in glob.glob(pattern)
+                   if os.path.isfile(path) and os.path.splitext(path)[1].lower() in SUPPORTED_EXTENSIONS)
+    if not paths:
+        print(f"\n❌ No supported files match {pattern}")
+        return 1
+
+    manifest = Manifest(args.manifest)
+    fingerprint = prompt_fingerprint(model, args.analysis, args.output_format)
+    # Every file's analyses share the ANALYSIS_WORKERS pool, so more files in
+    # flight than that would only wait there, each holding its parsed data
+    workers = max(1, min(args.workers, ANALYSIS_WORKERS))
+    print(f"\n📂 {len(paths)} files match {pattern}; analysing up to {workers} at a time...\n")
+
+    counts = {'done': 0, 'skipped': 0, 'failed': 0}
+    bytes_read = 0
+    parse_seconds = 0.0
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='file') as pool:
+        futures = {
+            pool.submit(analyse_file, path, args.analysis, args.output_format, manifest, fingerprint, args.force): path
+            for path in paths
+        }
+        for future in as_completed(futures):
+            file_name = os.path.basename(futures[future])
+            try:
+                outcome = future.result()
+            except Exception as e:
+                counts['failed'] += 1
+                log_analysis(file_name, success=False, error_msg=str(e))
+                print(f"❌ {file_name}: {e}")
+                continue
+            counts[outcome['status']] += 1
+            if outcome['status'] == 'skipped':
+                print(f"↷ {file_name}: unchanged since the last run, skipped")
+                continue
+            bytes_read += outcome['bytes']
+            parse_seconds += outcome['parse_seconds']
+            log_analysis(file_name, success=True)
+            print(f"✓ {file_name} → {outcome['report']}")
+    elapsed = time.perf_counter() - started
+
+    print("\n" + "="*60)
+    print("           BATCH SUMMARY")
+    print("="*60)
+    print(f"Files:      {len(paths)} found, {counts['done']} analysed, "
+          f"{counts['skipped']} unchanged (skipped), {counts['failed']} failed")
+    print(f"Data read:  {bytes_read / 1e6:.1f} MB, {parse_seconds:.1f}s spent parsing")
+    print(f"Wall time:  {elapsed:.1f}s ({counts['done'] / elapsed:.2f} files/s, "
+          f"{bytes_read / 1e6 / elapsed:.2f} MB/s analysed)")
+    print(f"Reports:    {os.path.join('outputs', 'reports')}")
+    print("="*60 + "\n")
+    return 1 if counts['failed'] else 0
+
+def run_interactive():
     """Main application function."""
     try:
         # Display banner
@@ -115,20 +302,23 @@ def main():
         print("\n🤖 Analyzing data with AI...")
         print("   This may take a moment. Please wait...\n")
         
-        results = {}
+        tasks = {}
         
         # Standard analysis
         if analysis_choice in [1, 3]:
             print("⏳ Performing individual student analysis...")
-            standard_analysis = analyze_student_data(student_data)
-            results['standard'] = standard_analysis
-            print("✓ Individual analysis complete")
+            tasks['standard'] = (analyze_student_data, student_data, print_shard_progress)
         
         # Comparative analysis
         if analysis_choice in [2, 3]:
             print("⏳ Performing comparative class analysis...")
-            comparative_analysis = generate_comparative_analysis(student_data)
-            results['comparative'] = comparative_analysis
+            tasks['comparative'] = (generate_comparative_analysis, student_data)
+        
+        # Both run concurrently, so mode 3 takes about as long as the slower one
+        results = run_analyses(tasks)
+        if 'standard' in results:
+            print("✓ Individual analysis complete")
+        if 'comparative' in results:
             print("✓ Comparative analysis complete")
         
         # Display results
@@ -168,5 +358,11 @@ def main():
                     success=False, error_msg=str(e))
         sys.exit(1)
 
+def main(argv=None):
+    args = parse_args(argv)
+    if args.input_dir or args.glob:
+        sys.exit(run_batch(args))
+    run_interactive()
+
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,236 @@
+import io
+import os
+import zipfile
+import logging
+import time
+from collections import Counter
+from concurrent.futures import CancelledError, FIRST_COMPLETED, wait
+from concurrent.futures.process import BrokenProcessPool
+
+from modules.data_extractor import read_data, get_chart_data, StreamingSummary
+from modules.gemini_analyzer import build_analysis_tasks, run_analyses, generate_cross_class_analysis
+from modules.process_pool import WatchedProcessPool
+
+# Many gradebooks in one request (/api/analyze/batch). Files are parsed in
+# parallel on a process pool, their analyses all go through run_analyses (so
+# the shared pool and the global Gemini rate limit apply), and every table is
+# also folded into one cross-class comparative report.
+BATCH_WORKERS = int(os.getenv("BATCH_WORKERS", min(4, os.cpu_count() or 1)))
+BATCH_MAX_FILES = int(os.getenv("BATCH_MAX_FILES", 50))
+BATCH_MAX_BYTES = int(os.getenv("BATCH_MAX_BYTES", 256 * 1024 * 1024))  # uncompressed total, so a ZIP cannot expand without bound
+BATCH_PARSE_TIMEOUT = float(os.getenv("BATCH_PARSE_TIMEOUT", 120))  # seconds per file, from when it starts parsing
+SUPPORTED_EXTENSIONS = ('.csv', '.xlsx', '.xls', '.txt', '.pdf')
+UNREADABLE = 'Could not process file. Valid formats: CSV, Excel, PDF, Text.'
+_MAX_RESUBMITS = 2  # a file whose call keeps dying with pools other files broke is given up on
+_START_POLL_SECONDS = 0.5  # how often to look for newly started files while none is running
+
+class BatchError(ValueError):
+    """The batch as a whole is unusable (no files, too many, or too large)."""
+
+def _unique_name(name, seen):
+    stem, extension = os.path.splitext(name)
+    count = seen.get(name, 0)
+    seen[name] = count + 1
+    return f"{stem}_{count + 1}{extension}" if count else name
+
+def expand_uploads(uploads):
+    """
+    Flattens (filename, bytes) uploads into the files to analyse. ZIP archives
+    are replaced by their supported members, named after their path in the
+    archive; repeated names get a numeric suffix.
+
+    Returns:
+        tuple: (files, skipped) as lists of (name, bytes) and (name, reason)
+    Raises:
+        BatchError: no files, more than BATCH_MAX_FILES, or over BATCH_MAX_BYTES
+    """
+    files = []
+    skipped = []
+    seen = {}
+    total = 0
+
+    def add(name, size, read):
+        nonlocal total
+        if os.path.splitext(name)[1].lower() not in SUPPORTED_EXTENSIONS:
+            skipped.append((name, 'unsupported file type'))
+            return
+        total += size
+        if len(files) >= BATCH_MAX_FILES:
+            raise BatchError(f"A batch may hold at most {BATCH_MAX_FILES} files")
+        if total > BATCH_MAX_BYTES:
+            raise BatchError(f"A batch may hold at most {BATCH_MAX_BYTES} bytes once unzipped")
+        files.append((_unique_name(name, seen), read()))
+
+    for filename, payload in uploads:
+        if not filename.lower().endswith('.zip'):
+            add(filename, len(payload), lambda: payload)
+            continue
+        try:
+            archive = zipfile.ZipFile(io.BytesIO(payload))
+        except zipfile.BadZipFile:
+            skipped.append((filename, 'not a valid ZIP archive'))
+            continue
+        with archive:
+            for info in archive.infolist():
+                parts = info.filename.split('/')
+                if info.is_dir() or parts[0] == '__MACOSX' or parts[-1].startswith('.'):
+                    continue
+                name = '_'.join(part for part in parts if part not in ('', '.', '..'))
+                # file_size is what ZipExtFile will stop at, so checking it first bounds the read
+                add(name, info.file_size, lambda: archive.read(info))
+
+    if not files:
+        raise BatchError('No supported files in the batch. Valid formats: CSV, Excel, PDF, Text, or a ZIP of them.')
+    return files, skipped
+
+def _init_parse_worker():
+    # The batch pool already spreads files over the cores; a PDF's pages are
+    # extracted in this worker rather than on a nested page pool per worker.
+    # PDF_PAGE_TIMEOUT does not apply in-process; BATCH_PARSE_TIMEOUT bounds the whole file.
+    from modules import pdf_extractor
+    pdf_extractor.PDF_WORKERS = 1
+
+_pool = WatchedProcessPool(BATCH_WORKERS, initializer=_init_parse_worker)
+
+def parse_files(files, stats_only=False):
+    """
+    Parses (name, bytes) files with read_data, in parallel on a process pool
+    when there is more than one. A file that crashes its worker, or runs
+    longer than BATCH_PARSE_TIMEOUT once started, comes back as None; the
+    pool is rebuilt and the batch's other unfinished files are resubmitted.
+
+    Returns:
+        dict: name -> parsed data (None if unreadable)
+    """
+    if BATCH_WORKERS <= 1 or len(files) < 2:
+        return {name: read_data(payload, stats_only=stats_only, filename=name) for name, payload in files}
+
+    payloads = dict(files)
+    results = {}
+    lost = Counter()  # calls of each file that died with a pool it did not break
+    pending = {}  # future -> (name, ticket)
+
+    def submit(name):
+        future, ticket = _pool.submit(read_data, payloads[name], stats_only=stats_only, filename=name)
+        pending[future] = (name, ticket)
+
+    def collect(future):
+        name, ticket = pending.pop(future)
+        try:
+            results[name] = future.result()
+        except (BrokenProcessPool, CancelledError):
+            if _pool.crashed(ticket):
+                logging.error(f"Parse worker died on {name}; skipping it")
+                results[name] = None
+            elif lost[name] >= _MAX_RESUBMITS:
+                logging.error(f"Parsing {name} was interrupted {lost[name] + 1} times; skipping it")
+                results[name] = None
+            else:
+                # The pool went down under it (another file crashed or overran); run it again
+                lost[name] += 1
+                submit(name)
+        except Exception as e:
+            logging.error(f"Parsing {name} failed: {e}")
+            results[name] = None
+        finally:
+            _pool.forget(ticket)
+
+    for name, _ in files:
+        submit(name)
+    while pending:
+        starts = {future: _pool.started(ticket) for future, (_, ticket) in pending.items()}
+        deadlines = [started + BATCH_PARSE_TIMEOUT for started in starts.values() if started is not None]
+        timeout = max(0.0, min(deadlines) - time.monotonic()) if deadlines else _START_POLL_SECONDS
+        done, _ = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+        for future in done:
+            collect(future)
+
+        now = time.monotonic()
+        overdue = [future for future, started in starts.items()
+                   if future in pending and not future.done() and started is not None
+                   and now - started >= BATCH_PARSE_TIMEOUT]
+        if not overdue:
+            continue
+        for future in overdue:
+            name, ticket = pending.pop(future)
+            _pool.forget(ticket)
+            logging.error(f"Parsing {name} took longer than {BATCH_PARSE_TIMEOUT}s; skipping it")
+            results[name] = None
+        # The overrunning worker may be wedged for good; replace the pool and resubmit the rest at once
+        _pool.restart()
+        for future in list(pending):
+            if future.done() and not future.cancelled() and future.exception() is None:
+                collect(future)
+                continue
+            name, ticket = pending.pop(future)
+            _pool.forget(ticket)
+            submit(name)
+    return results
+
+def _as_summary(data):
+    if isinstance(data, StreamingSummary):
+        return data
+    summary = StreamingSummary()
+    summary.update(data)
+    return summary
+
+def run_batch(files, analysis_type=3):
+    """
+    Parses and analyses a batch. Each file succeeds or fails on its own.
+
+    Returns:
+        dict: 'files' holds one entry per file (filename, status, and either
+              text_results/chart_data or error); 'combined' holds the
+              cross-class comparative report when two or more files are tables.
+    """
+    parsed = parse_files(files, stats_only=analysis_type == 2)
+
+    entries = []
+    tasks = {}
+    summaries = {}
+    for name, _ in files:
+        data = parsed.get(name)
+        if data is None or (isinstance(data, str) and data.startswith("Error")):
+            entries.append({'filename': name, 'status': 'error', 'error': data or UNREADABLE})
+            continue
+
+        chart_data = None
+        if not isinstance(data, str):
+            if analysis_type == 4:
+                data = data.to_string()
+            else:
+                summaries[name] = _as_summary(data)
+                chart_data = get_chart_data(data)
+
+        file_tasks, static_results = build_analysis_tasks(data, analysis_type)
+        for key, task in file_tasks.items():
+            tasks[(name, key)] = task
+        entries.append({'filename': name, 'status': 'ok', 'text_results': static_results, 'chart_data': chart_data})
+
+    combined = None
+    if len(summaries) > 1 and analysis_type != 4:
+        tasks[('combined', 'comparative')] = (generate_cross_class_analysis, summaries)
+        merged = StreamingSummary()
+        for summary in summaries.values():
+            merged.merge(summary)
+        combined = {'classes': list(summaries), 'chart_data': get_chart_data(merged)}
+
+    results = run_analyses(tasks)
+    for entry in entries:
+        if entry['status'] == 'ok':
+            entry['text_results'].update(
+                {key: text for (name, key), text in results.items() if name == entry['filename']})
+    if combined is not None:
+        combined['comparative'] = results[('combined', 'comparative')]
+
+    failed = sum(entry['status'] == 'error' for entry in entries)
+    logging.info(f"Batch of {len(entries)} files analysed; {failed} could not be read")
+    return {
+        'files': entries,
+        'combined': combined,
+        'summary': {'files': len(entries), 'succeeded': len(entries) - failed, 'failed': failed},
+    }
+
+def get_batch_stats():
+    return {'workers': BATCH_WORKERS, 'max_files': BATCH_MAX_FILES, 'max_bytes': BATCH_MAX_BYTES,
+            'pool_restarts': _pool.restarts}
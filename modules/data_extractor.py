@@ -1,98 +1,777 @@
 import pandas as pd
+import numpy as np
+import io
 import os
+import time
+import zlib
+import codecs
+import pickle
+import shutil
+import hashlib
 import logging
+import tempfile
+import threading
+from collections import OrderedDict
+from modules.tracing import traced
+from modules.metrics import observe_parse
+from modules.pdf_extractor import iter_pdf_pages, PdfPasswordError, PDF_MAX_PAGES
 # We remove the top-level 'from pypdf import PdfReader' to prevent app crashes if library is missing
-# It is now imported inside the _read_pdf function
+# It is now imported inside the _read_pdf function (and modules.pdf_extractor)
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(levelname)s: %(message)s')
 
-def read_data(file_path):
+# CSV and text files are decoded in a single pass with an encoding sniffed
+# from the first ENCODING_SAMPLE_BYTES (see open_text).
+ENCODING_SAMPLE_BYTES = int(os.getenv("ENCODING_SAMPLE_BYTES", 64 * 1024))
+
+# Streaming CSV mode: parsed CSV_CHUNK_ROWS rows at a time into a
+# StreamingSummary, so class statistics never need the whole frame in memory.
+CSV_CHUNK_ROWS = int(os.getenv("CSV_CHUNK_ROWS", 50000))
+SUMMARY_SAMPLE_SIZE = int(os.getenv("SUMMARY_SAMPLE_SIZE", 10000))  # values kept per column for quartiles
+
+# Uploaded streams are parsed from memory; one longer than UPLOAD_SPOOL_BYTES
+# is copied to a temporary file first instead of being held in RAM.
+UPLOAD_SPOOL_BYTES = int(os.getenv("UPLOAD_SPOOL_BYTES", 32 * 1024 * 1024))
+
+# Streamed uploads (read_stream) are only summarised in stats_only mode; other
+# analyses need the whole table or text, so it may take at most this many
+# bytes in memory and a larger upload is refused.
+STREAM_MAX_BYTES = int(os.getenv("STREAM_MAX_BYTES", 256 * 1024 * 1024))
+_TEXT_BLOCK_CHARS = 1024 * 1024
+
+_BOMS = [
+    (codecs.BOM_UTF32_LE, 'utf-32'),  # before UTF-16 LE, whose BOM is a prefix of it
+    (codecs.BOM_UTF32_BE, 'utf-32'),
+    (codecs.BOM_UTF8, 'utf-8-sig'),
+    (codecs.BOM_UTF16_LE, 'utf-16'),
+    (codecs.BOM_UTF16_BE, 'utf-16'),
+]
+# Bytes with no character in cp1252; their presence rules it out
+_CP1252_UNDEFINED = {0x81, 0x8D, 0x8F, 0x90, 0x9D}
+FALLBACK_ERRORS = 'gradebook_fallback'
+
+# 'pyarrow': multithreaded Arrow parse with Arrow-backed dtypes when pyarrow is
+# installed, falling back to the C engine otherwise; 'c': always the C engine.
+CSV_ENGINE = os.getenv("CSV_ENGINE", "pyarrow")
+
+# Excel workbooks are read lazily, EXCEL_CHUNK_ROWS rows at a time, with
+# python-calamine when installed (also reads .xls) or openpyxl in read-only mode.
+EXCEL_ENGINE = os.getenv("EXCEL_ENGINE", "calamine")  # calamine | openpyxl
+EXCEL_SHEETS = os.getenv("EXCEL_SHEETS", "first")  # first | all | comma-separated sheet names
+EXCEL_CHUNK_ROWS = int(os.getenv("EXCEL_CHUNK_ROWS", 20000))
+SHEET_COLUMN = 'sheet'  # added when rows come from more than one sheet
+
+# Post-ingest compaction of CSV/Excel frames (see compact_dataframe)
+COMPACT_DATAFRAMES = os.getenv("COMPACT_DATAFRAMES", "1") != "0"
+CATEGORY_MAX_RATIO = float(os.getenv("CATEGORY_MAX_RATIO", 0.5))  # text columns with fewer distinct values per row become categorical
+_INT_TYPES = [np.int8, np.int16, np.int32]
+
+class _CompactionStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.frames = 0
+        self.bytes_before = 0
+        self.bytes_after = 0
+
+    def record(self, before, after):
+        with self._lock:
+            self.frames += 1
+            self.bytes_before += before
+            self.bytes_after += after
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'enabled': COMPACT_DATAFRAMES,
+                'frames': self.frames,
+                'bytes_before': self.bytes_before,
+                'bytes_after': self.bytes_after,
+                'savings_ratio': round(1 - self.bytes_after / self.bytes_before, 4) if self.bytes_before else 0.0,
+            }
+
+_compaction_stats = _CompactionStats()
+
+def get_compaction_stats():
+    return _compaction_stats.snapshot()
+
+# Parsed uploads keyed by the SHA-256 of the file bytes, so a repeat upload
+# skips parsing. Tables/summaries are kept as pickle-5 blobs, text as zlib
+# blobs; every hit unpickles a fresh copy. Bump PARSER_VERSION whenever a
+# reader's output changes so stale entries stop matching.
+EXTRACT_CACHE_ENABLED = os.getenv("EXTRACT_CACHE_ENABLED", "1") != "0"
+EXTRACT_CACHE_MAX_BYTES = int(os.getenv("EXTRACT_CACHE_MAX_BYTES", 128 * 1024 * 1024))
+PARSER_VERSION = 1
+_HASH_BLOCK = 1024 * 1024
+
+class _ExtractionCache:
+    """In-process LRU of serialized parse results, bounded by total blob bytes."""
+    def __init__(self, max_bytes=EXTRACT_CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # key -> (kind, blob)
+        self._lock = threading.Lock()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+        kind, blob = entry
+        if kind == 'text':
+            return zlib.decompress(blob).decode('utf-8')
+        return pickle.loads(blob)
+
+    def put(self, key, data):
+        if isinstance(data, str):
+            kind, blob = 'text', zlib.compress(data.encode('utf-8'), 1)
+        else:
+            kind, blob = 'pickle', pickle.dumps(data, protocol=5)
+        if len(blob) > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self.bytes -= len(previous[1])
+            self._entries[key] = (kind, blob)
+            self.bytes += len(blob)
+            while self.bytes > self.max_bytes:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self.bytes -= len(evicted)
+                self.evictions += 1
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'enabled': EXTRACT_CACHE_ENABLED,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_ratio': round(self.hits / lookups, 4) if lookups else 0.0,
+                'entries': len(self._entries),
+                'bytes': self.bytes,
+                'max_bytes': self.max_bytes,
+            }
+
+_extraction_cache = _ExtractionCache()
+
+def get_extraction_cache_stats():
+    return _extraction_cache.stats()
+
+@traced()
+def _extraction_key(source, file_extension, stats_only, sheets):
+    """SHA-256 of the input bytes plus everything that changes what its parse returns."""
+    digest = hashlib.sha256()
+    if isinstance(source, bytes):
+        digest.update(source)
+    else:
+        with open(source, 'rb') as f:
+            for block in iter(lambda: f.read(_HASH_BLOCK), b''):
+                digest.update(block)
+    options = (PARSER_VERSION, file_extension, stats_only, sheets or EXCEL_SHEETS, CSV_ENGINE,
+               EXCEL_ENGINE, COMPACT_DATAFRAMES, PDF_MAX_PAGES)
+    digest.update(repr(options).encode('utf-8'))
+    return digest.hexdigest()
+
+def _spool(source, suffix=''):
+    """
+    Turns read_data's input into a path or bytes. Streams of up to
+    UPLOAD_SPOOL_BYTES are read into memory; longer ones are copied to a
+    temporary file, whose path is also returned for the caller to remove.
+    """
+    if isinstance(source, (str, os.PathLike)):
+        return os.fspath(source), None
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return bytes(source), None
+    stream = getattr(source, 'stream', source)  # werkzeug FileStorage
+    head = stream.read(UPLOAD_SPOOL_BYTES + 1)
+    if len(head) <= UPLOAD_SPOOL_BYTES:
+        return head, None
+    with tempfile.NamedTemporaryFile(suffix=suffix, delete=False) as f:
+        f.write(head)
+        shutil.copyfileobj(stream, f, _HASH_BLOCK)
+    logging.info(f"Upload is over {UPLOAD_SPOOL_BYTES} bytes; spooled it to {f.name}")
+    return f.name, f.name
+
+def _as_file(source):
+    """What pandas, openpyxl and pypdf take: the path itself, or a buffer over in-memory bytes."""
+    return io.BytesIO(source) if isinstance(source, bytes) else source
+
+def _source_name(source):
+    return os.path.basename(source) if isinstance(source, str) else 'upload'
+
+@traced()
+def read_data(source, stats_only=False, sheets=None, filename=None):
     """
     Controller function to read data from various file formats.
+    source is a path, bytes, or a binary stream (BytesIO, werkzeug FileStorage);
+    for the latter two the format comes from filename (or the stream's own name).
+    With stats_only, CSV and Excel files are streamed into a StreamingSummary
+    instead of being loaded; that is all comparative analysis and charts need.
+    sheets picks Excel sheets ('first', 'all', names); default EXCEL_SHEETS.
     """
-    if not os.path.exists(file_path):
-        logging.error(f"File not found: {file_path}")
-        return None
+    if isinstance(source, (str, os.PathLike)):
+        if not os.path.exists(source):
+            logging.error(f"File not found: {source}")
+            return None
+        filename = filename or os.fspath(source)
+    else:
+        filename = filename or getattr(source, 'filename', None) or getattr(source, 'name', None) or ''
 
-    _, file_extension = os.path.splitext(file_path)
+    _, file_extension = os.path.splitext(filename)
     file_extension = file_extension.lower()
 
+    source, spooled = _spool(source, file_extension)
+    try:
+        return _parse(source, file_extension, stats_only, sheets)
+    finally:
+        if spooled:
+            os.remove(spooled)
+
+def _parse(source, file_extension, stats_only, sheets):
+    cache_key = None
+    if EXTRACT_CACHE_ENABLED and file_extension in ['.xlsx', '.xls', '.csv', '.txt', '.pdf']:
+        cache_key = _extraction_key(source, file_extension, stats_only, sheets)
+        cached = _extraction_cache.get(cache_key)
+        if cached is not None:
+            return cached
+
+    started = time.perf_counter()
+    data = None
     try:
-        if file_extension in ['.xlsx', '.xls']:
-            return _read_excel(file_path)
+        if file_extension in ['.xlsx', '.xls'] and stats_only:
+            data = read_excel_summary(source, sheets)
+        elif file_extension in ['.xlsx', '.xls']:
+            data = _read_excel(source, sheets)
+        elif file_extension == '.csv' and stats_only:
+            data = read_csv_summary(source)
         elif file_extension == '.csv':
-            return _read_csv(file_path)
+            data = _read_csv(source)
         elif file_extension == '.txt':
-            return _read_text(file_path)
+            data = _read_text(source)
         elif file_extension == '.pdf':
-            return _read_pdf(file_path)
+            data = _read_pdf(source)
         else:
             logging.error(f"Unsupported file type: {file_extension}")
-            return None
+        if COMPACT_DATAFRAMES and isinstance(data, pd.DataFrame):
+            data = compact_dataframe(data)
     except Exception as e:
         logging.error(f"Error reading file: {e}")
-        return None
+    observe_parse(file_extension, time.perf_counter() - started, data is not None)
+    # PDF problems come back as "Error..." text; those may be environmental (e.g. pypdf missing)
+    if cache_key and data is not None and not (isinstance(data, str) and data.startswith("Error")):
+        _extraction_cache.put(cache_key, data)
+    return data
 
-def _read_excel(file_path):
+@traced()
+def _read_excel(source, sheets=None):
     try:
-        df = pd.read_excel(file_path, engine='openpyxl')
-        df.columns = df.columns.str.strip().str.lower().str.replace(' ', '_')
-        df = df.dropna(how='all')
-        return df
+        chunks = list(iter_excel_chunks(source, sheets))
+        if not chunks:
+            logging.error("Excel reading error: the selected sheets are blank")
+            return None
+        # Chunks infer dtypes separately; a column mixing numbers and text stays object
+        return pd.concat(chunks, ignore_index=True).infer_objects()
     except Exception as e:
         logging.error(f"Excel reading error: {e}")
         return None
 
-def _read_csv(file_path):
-    encodings = ['utf-8', 'latin-1', 'iso-8859-1', 'cp1252']
-    for encoding in encodings:
+class _CalamineBook:
+    def __init__(self, source):
+        from python_calamine import CalamineWorkbook
+        if isinstance(source, bytes):
+            self._workbook = CalamineWorkbook.from_filelike(io.BytesIO(source))
+        else:
+            self._workbook = CalamineWorkbook.from_path(source)
+        self.sheet_names = self._workbook.sheet_names
+
+    def rows(self, name):
+        # calamine reports empty cells as ''
+        for row in self._workbook.get_sheet_by_name(name).iter_rows():
+            yield [None if value == '' else value for value in row]
+
+    def close(self):
+        self._workbook.close()
+
+class _OpenpyxlBook:
+    def __init__(self, source):
+        from openpyxl import load_workbook
+        self._workbook = load_workbook(_as_file(source), read_only=True, data_only=True)
+        self.sheet_names = self._workbook.sheetnames
+
+    def rows(self, name):
+        return self._workbook[name].iter_rows(values_only=True)
+
+    def close(self):
+        self._workbook.close()
+
+def _open_excel(source):
+    if EXCEL_ENGINE == 'calamine':
         try:
-            df = pd.read_csv(file_path, encoding=encoding)
-            df.columns = df.columns.str.strip().str.lower().str.replace(' ', '_')
-            df = df.dropna(how='all')
+            return _CalamineBook(source)
+        except ImportError:
+            pass
+    return _OpenpyxlBook(source)
+
+def _select_sheets(names, sheets=None):
+    spec = sheets or EXCEL_SHEETS
+    if isinstance(spec, str):
+        if spec == 'first':
+            return names[:1]
+        if spec == 'all':
+            return list(names)
+        spec = [name.strip() for name in spec.split(',') if name.strip()]
+    selected = [name for name in spec if name in names]
+    missing = [name for name in spec if name not in names]
+    if not selected:
+        raise ValueError(f"None of the sheets {spec} exist; the workbook has {names}")
+    if missing:
+        logging.warning(f"Skipping missing sheets: {missing}")
+    return selected
+
+def _header_names(row):
+    """Header cells as unique strings; blanks become unnamed_<i>, repeats get .1, .2 like pandas."""
+    names = []
+    seen = {}
+    for i, value in enumerate(row):
+        name = str(value).strip() if value is not None else f"unnamed_{i}"
+        count = seen.get(name, 0)
+        seen[name] = count + 1
+        names.append(f"{name}.{count}" if count else name)
+    return names
+
+def _excel_chunk(header, rows, sheet):
+    width = len(header)
+    rows = [tuple(row[:width]) + (None,) * (width - len(row)) for row in rows]
+    chunk = _normalise_columns(pd.DataFrame.from_records(rows, columns=header))
+    if sheet is not None:
+        chunk[SHEET_COLUMN] = sheet
+    return chunk
+
+def iter_excel_chunks(source, sheets=None, chunksize=EXCEL_CHUNK_ROWS):
+    """
+    Yields the selected sheets as normalised DataFrame chunks, pulling rows
+    lazily from a read-only workbook. The first non-blank row of each sheet
+    is its header; with several sheets every row is tagged with its sheet name.
+    A sheet with a header but no rows yields one empty chunk, so its columns
+    are kept (as a header-only CSV's are).
+    """
+    book = _open_excel(source)
+    try:
+        selected = _select_sheets(book.sheet_names, sheets)
+        tag = len(selected) > 1
+        for name in selected:
+            header = None
+            batch = []
+            yielded = False
+            for row in book.rows(name):
+                if header is None:
+                    if any(value is not None for value in row):
+                        header = _header_names(row)
+                    continue
+                batch.append(row)
+                if len(batch) >= chunksize:
+                    yield _excel_chunk(header, batch, name if tag else None)
+                    batch = []
+                    yielded = True
+            if batch or (header is not None and not yielded):
+                yield _excel_chunk(header, batch, name if tag else None)
+    finally:
+        book.close()
+
+@traced()
+def _read_csv(source):
+    if CSV_ENGINE == 'pyarrow':
+        df = _read_csv_arrow(source)
+        if df is not None:
             return df
-        except UnicodeDecodeError:
+    try:
+        with open_text(source, newline='') as stream:
+            df = pd.read_csv(stream)
+        return _normalise_columns(df)
+    except Exception as e:
+        logging.error(f"CSV reading error: {e}")
+        return None
+
+@traced()
+def _read_csv_arrow(source):
+    """
+    Parses a CSV with the pyarrow engine into Arrow string and compact numeric
+    dtypes. Returns None (use the C engine) if pyarrow is missing or the parse
+    fails. Arrow keeps text that is not valid in the sniffed encoding as
+    binary; those columns are decoded in memory with _decode_fallback rather
+    than re-reading the file.
+    """
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return None
+
+    try:
+        if isinstance(source, bytes):
+            encoding = sniff_encoding(source[:ENCODING_SAMPLE_BYTES])
+        else:
+            with open(source, 'rb') as f:
+                encoding = sniff_encoding(f.read(ENCODING_SAMPLE_BYTES))
+        df = pd.read_csv(_as_file(source), engine='pyarrow', dtype_backend='pyarrow', encoding=encoding)
+        binary = [c for c, dtype in df.dtypes.items()
+                  if isinstance(dtype, pd.ArrowDtype) and pyarrow.types.is_binary(dtype.pyarrow_dtype)]
+        if binary:
+            logging.info(f"Columns {binary} are not valid {encoding}; decoding their stray bytes as cp1252")
+            for col in binary:
+                df[col] = df[col].map(
+                    lambda value: value.decode(encoding, errors=FALLBACK_ERRORS), na_action='ignore'
+                ).astype(pd.ArrowDtype(pyarrow.string()))
+        return _normalise_columns(df)
+    except Exception as e:
+        logging.warning(f"pyarrow CSV engine failed ({e}); falling back to the C engine")
+        return None
+
+@traced()
+def compact_dataframe(df):
+    """
+    Shrinks an ingested gradebook before analysis: drops all-null columns,
+    downcasts numbers (_downcast_numeric) and stores repetitive text such as
+    class, section or subject as category. Logs the memory before and after.
+    A frame with no rows is returned as is: every column is all-null there,
+    and a header-only gradebook should keep its columns.
+    """
+    if df.empty:
+        return df
+    before = int(df.memory_usage(deep=True).sum())
+    df = _downcast_numeric(df.dropna(axis=1, how='all'))
+    if len(df) > 1:
+        for col in df.columns:
+            dtype = df[col].dtype
+            if isinstance(dtype, pd.CategoricalDtype):
+                continue
+            if not (pd.api.types.is_object_dtype(dtype) or pd.api.types.is_string_dtype(dtype)):
+                continue
+            if df[col].nunique() <= CATEGORY_MAX_RATIO * len(df):
+                df[col] = df[col].astype('category')
+    after = int(df.memory_usage(deep=True).sum())
+    _compaction_stats.record(before, after)
+    logging.info(f"Compacted {len(df)}x{len(df.columns)} frame: {before / 1e6:.2f} MB -> {after / 1e6:.2f} MB")
+    return df
+
+def _downcast_numeric(df):
+    """
+    Stores each numeric column in the smallest type that holds it exactly:
+    whole numbers as int8/16/32 (scores out of 100 take one byte), other
+    floats as float32 when no value changes. Arrow-backed columns stay Arrow,
+    NumPy columns with gaps become nullable integers.
+    """
+    for col in df.select_dtypes(include=['number']).columns:
+        values = df[col]
+        present = values.dropna()
+        if present.empty:
             continue
-        except Exception as e:
-            logging.error(f"CSV reading error: {e}")
-            return None
-    return None
+        arrow = isinstance(values.dtype, pd.ArrowDtype)
+        numbers = present.to_numpy(dtype=float)
+        target = None
+        if (numbers == np.round(numbers)).all():
+            low, high = numbers.min(), numbers.max()
+            for int_type in _INT_TYPES:
+                info = np.iinfo(int_type)
+                if info.min <= low and high <= info.max:
+                    target = int_type
+                    break
+        elif (numbers.astype(np.float32) == numbers).all():
+            target = np.float32
 
-def _read_text(file_path):
-    encodings = ['utf-8', 'latin-1', 'iso-8859-1', 'cp1252']
-    for encoding in encodings:
-        try:
-            with open(file_path, 'r', encoding=encoding) as f:
-                return f.read()
-        except UnicodeDecodeError:
+        if target is None or np.dtype(target).itemsize >= values.dtype.itemsize:
             continue
-    return None
+        if arrow:
+            import pyarrow
+            df[col] = values.astype(pd.ArrowDtype(pyarrow.from_numpy_dtype(target)))
+        elif target is np.float32 or not values.hasnans:
+            df[col] = values.astype(target)
+        else:
+            df[col] = values.astype(np.dtype(target).name.capitalize())  # e.g. 'Int8'
+    return df
+
+def _normalise_columns(df):
+    """snake_case column names and no fully empty rows."""
+    df.columns = df.columns.str.strip().str.lower().str.replace(' ', '_')
+    return df.dropna(how='all')
+
+def sniff_encoding(prefix):
+    """
+    Guesses the encoding of a file from its first bytes: a BOM wins, then
+    UTF-16 if NUL bytes suggest it, then UTF-8 if the prefix is valid UTF-8,
+    otherwise cp1252 (latin-1 if a byte cp1252 lacks is present).
+    """
+    for bom, encoding in _BOMS:
+        if prefix.startswith(bom):
+            return encoding
+
+    # Text without a BOM rarely contains NULs, except as the high byte of UTF-16
+    # ASCII; checked before UTF-8, which such text (NULs included) also is
+    if prefix.count(0) > len(prefix) // 4:
+        even_nuls = prefix[0::2].count(0)
+        odd_nuls = prefix[1::2].count(0)
+        return 'utf-16-le' if odd_nuls > even_nuls else 'utf-16-be'
+    try:
+        # final=False: the prefix may end in the middle of a multi-byte character
+        codecs.getincrementaldecoder('utf-8')().decode(prefix, final=False)
+        return 'utf-8'
+    except UnicodeDecodeError:
+        pass
+    if any(byte in _CP1252_UNDEFINED for byte in prefix):
+        return 'latin-1'
+    return 'cp1252'
+
+def _decode_fallback(error):
+    """Codec error handler: bytes that do not fit the sniffed encoding are read as cp1252 (or latin-1)."""
+    bad = error.object[error.start:error.end]
+    text = "".join(bytes([byte]).decode('cp1252', errors='ignore') or chr(byte) for byte in bad)
+    return text, error.end
 
-def _read_pdf(file_path):
+codecs.register_error(FALLBACK_ERRORS, _decode_fallback)
+
+def open_text(source, newline=None, sample_bytes=ENCODING_SAMPLE_BYTES):
+    """
+    Opens a file (in-memory bytes, or an open binary stream) for reading as
+    text with a sniffed encoding. The prefix is peeked from the read buffer,
+    so the file is read from disk exactly once; a stray byte later on that
+    does not fit the encoding is decoded by _decode_fallback instead of
+    failing the whole read.
+    """
+    if isinstance(source, bytes):
+        raw = io.BytesIO(source)
+        encoding = sniff_encoding(source[:sample_bytes])
+    elif hasattr(source, 'read'):
+        # A stream may still be arriving; sniff whatever its first read buffered
+        raw = source if hasattr(source, 'peek') else io.BufferedReader(source, max(sample_bytes, io.DEFAULT_BUFFER_SIZE))
+        encoding = sniff_encoding(raw.peek(sample_bytes)[:sample_bytes])
+    else:
+        raw = open(source, 'rb', buffering=max(sample_bytes, io.DEFAULT_BUFFER_SIZE))
+        try:
+            encoding = sniff_encoding(raw.peek(sample_bytes)[:sample_bytes])
+        except Exception:
+            raw.close()
+            raise
+    if encoding != 'utf-8':
+        logging.info(f"Reading {_source_name(source)} as {encoding}")
+    return io.TextIOWrapper(raw, encoding=encoding, errors=FALLBACK_ERRORS, newline=newline)
+
+def iter_csv_chunks(source, chunksize=CSV_CHUNK_ROWS):
+    """Yields a CSV as normalised DataFrame chunks, decoded in a single pass."""
+    with open_text(source, newline='') as stream:
+        with pd.read_csv(stream, chunksize=chunksize) as reader:
+            for chunk in reader:
+                yield _normalise_columns(chunk)
+
+@traced()
+def read_csv_summary(source, chunksize=CSV_CHUNK_ROWS):
+    """Streams a CSV into a StreamingSummary. Returns None if it cannot be parsed."""
+    try:
+        return _summarise(iter_csv_chunks(source, chunksize), source)
+    except Exception as e:
+        logging.error(f"CSV streaming error: {e}")
+        return None
+
+@traced()
+def read_excel_summary(source, sheets=None, chunksize=EXCEL_CHUNK_ROWS):
+    """Streams the selected Excel sheets into a StreamingSummary. Returns None if they cannot be read."""
+    try:
+        return _summarise(iter_excel_chunks(source, sheets, chunksize), source)
+    except Exception as e:
+        logging.error(f"Excel streaming error: {e}")
+        return None
+
+@traced()
+def read_stream(stream, file_extension, stats_only=False):
+    """
+    Parses a CSV or TXT from a binary stream as its bytes arrive, e.g. an
+    upload whose later parts are still being sent (modules.upload_sessions).
+    CSV rows are parsed chunk by chunk; with stats_only only a StreamingSummary
+    is kept, so memory stays bounded however long the stream is. Otherwise
+    the table or text is kept whole, up to STREAM_MAX_BYTES in memory. Unlike
+    read_data, errors are raised rather than logged.
+
+    Raises:
+        ValueError: the upload cannot be parsed, or is over STREAM_MAX_BYTES without stats_only
+    """
+    started = time.perf_counter()
+    data = None
+    try:
+        if file_extension == '.csv' and stats_only:
+            data = _summarise(iter_csv_chunks(stream), stream)
+        elif file_extension == '.csv':
+            chunks = []
+            size = 0
+            for chunk in iter_csv_chunks(stream):
+                size += int(chunk.memory_usage(deep=True).sum())
+                _check_stream_size(size)
+                chunks.append(chunk)
+            # Chunks infer dtypes separately; a column mixing numbers and text stays object
+            data = pd.concat(chunks, ignore_index=True).infer_objects() if chunks else None
+            if COMPACT_DATAFRAMES and data is not None:
+                data = compact_dataframe(data)
+        elif file_extension == '.txt':
+            parts = []
+            size = 0
+            with open_text(stream) as text:
+                for part in iter(lambda: text.read(_TEXT_BLOCK_CHARS), ''):
+                    size += len(part)
+                    _check_stream_size(size)
+                    parts.append(part)
+            data = "".join(parts)
+        else:
+            raise ValueError(f"{file_extension} files cannot be parsed while they are still arriving")
+        return data
+    finally:
+        observe_parse(file_extension, time.perf_counter() - started, data is not None)
+
+def _check_stream_size(size):
+    if size > STREAM_MAX_BYTES:
+        raise ValueError(
+            f"This upload is larger than {STREAM_MAX_BYTES // (1024 * 1024)} MB once parsed. "
+            "Files this size can only be analysed for class statistics (analysis type 2)."
+        )
+
+def _summarise(chunks, source):
+    summary = StreamingSummary()
+    for chunk in chunks:
+        summary.update(chunk)
+    logging.info(f"Streamed {summary.rows} rows from {_source_name(source)}")
+    return summary
+
+class _ColumnStats:
+    """Mergeable count/mean/variance/min/max plus a bottom-k uniform sample for quartiles."""
+    def __init__(self, sample_size):
+        self.sample_size = sample_size
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = np.nan
+        self.max = np.nan
+        self.sample = np.empty(0)
+        self.keys = np.empty(0)
+
+    def add(self, values, rng):
+        if len(values):
+            self._combine(len(values), values.mean(), ((values - values.mean()) ** 2).sum(),
+                          values.min(), values.max(), values, rng.random(len(values)))
+
+    def merge(self, other):
+        if other.count:
+            self._combine(other.count, other.mean, other.m2, other.min, other.max, other.sample, other.keys)
+
+    def _combine(self, count, mean, m2, low, high, sample, keys):
+        # Chan et al. parallel update, so chunk order and merging do not affect precision
+        total = self.count + count
+        delta = mean - self.mean
+        self.mean += delta * count / total
+        self.m2 += m2 + delta ** 2 * self.count * count / total
+        self.count = total
+        self.min = low if np.isnan(self.min) else min(self.min, low)
+        self.max = high if np.isnan(self.max) else max(self.max, high)
+
+        # Keeping the values with the smallest random keys is a uniform sample of everything seen
+        sample = np.concatenate([self.sample, sample])
+        keys = np.concatenate([self.keys, keys])
+        if len(keys) > self.sample_size:
+            keep = np.argpartition(keys, self.sample_size)[:self.sample_size]
+            sample, keys = sample[keep], keys[keep]
+        self.sample, self.keys = sample, keys
+
+    def describe(self):
+        std = np.sqrt(self.m2 / (self.count - 1)) if self.count > 1 else np.nan
+        quartiles = np.percentile(self.sample, [25, 50, 75]) if len(self.sample) else [np.nan] * 3
+        mean = self.mean if self.count else np.nan
+        return [float(self.count), mean, std, self.min, *quartiles, self.max]
+
+class StreamingSummary:
+    """
+    Incremental per-column statistics for tables read in chunks: enough for
+    describe()-style class stats and chart averages without keeping the rows.
+    Quartiles are exact up to sample_size values per column and estimated
+    from a uniform sample beyond that.
+    """
+    DESCRIBE_INDEX = ['count', 'mean', 'std', 'min', '25%', '50%', '75%', 'max']
+
+    def __init__(self, sample_size=SUMMARY_SAMPLE_SIZE, seed=0):
+        self.sample_size = sample_size
+        self.rows = 0
+        self.columns = []
+        self._numeric = {}
+        self._non_numeric = set()
+        self._rng = np.random.default_rng(seed)
+
+    def __len__(self):
+        return self.rows
+
+    def update(self, chunk):
+        """Adds one DataFrame chunk. Columns that are non-numeric in any chunk are left out, as a full read would."""
+        self.rows += len(chunk)
+        numeric = set(chunk.select_dtypes(include=['number']).columns)
+        for col in chunk.columns:
+            if col not in self._numeric and col not in self._non_numeric:
+                self.columns.append(col)
+            if col in self._non_numeric:
+                continue
+            if col not in numeric:
+                self._numeric.pop(col, None)
+                self._non_numeric.add(col)
+                continue
+            stats = self._numeric.setdefault(col, _ColumnStats(self.sample_size))
+            stats.add(chunk[col].dropna().to_numpy(dtype=float), self._rng)
+
+    def merge(self, other):
+        """Folds in a summary of other rows with the same columns (e.g. built in parallel)."""
+        self.rows += other.rows
+        for col in other.columns:
+            if col not in self.columns:
+                self.columns.append(col)
+        self._non_numeric |= other._non_numeric
+        for col, stats in other._numeric.items():
+            if col not in self._non_numeric:
+                self._numeric.setdefault(col, _ColumnStats(self.sample_size)).merge(stats)
+        for col in self._non_numeric:
+            self._numeric.pop(col, None)
+        return self
+
+    def numeric_columns(self):
+        return [col for col in self.columns if col in self._numeric]
+
+    def describe(self):
+        """Same shape as DataFrame.describe() on the numeric columns."""
+        return pd.DataFrame(
+            {col: self._numeric[col].describe() for col in self.numeric_columns()},
+            index=self.DESCRIBE_INDEX,
+        )
+
+    def means(self):
+        return {col: float(self._numeric[col].mean) for col in self.numeric_columns() if self._numeric[col].count}
+
+@traced()
+def _read_text(source):
+    with open_text(source) as stream:
+        return stream.read()
+
+@traced()
+def _read_pdf(source):
     """
     Robustly extracts text from PDF files.
     """
     # Lazy import to prevent crash if pypdf is not installed
     try:
-        from pypdf import PdfReader
+        import pypdf  # noqa: F401
     except ImportError:
         return "Error: The 'pypdf' library is missing. Please run 'pip install pypdf' to use PDF features."
 
     try:
-        reader = PdfReader(file_path)
-        text = ""
-        
-        if reader.is_encrypted:
-            try:
-                reader.decrypt("")
-            except:
-                return "Error: This PDF is password protected and cannot be read."
-
-        for page in reader.pages:
-            extracted = page.extract_text()
-            if extracted:
-                text += extracted + "\n"
+        # Pages are extracted in parallel and collected in order; one join instead of repeated +=
+        text = "".join(page_text + "\n" for _, page_text in iter_pdf_pages(source) if page_text)
         
         # Basic cleanup
         if not text.strip():
@@ -100,30 +779,34 @@ def _read_pdf(file_path):
             return "Error: This PDF contains no selectable text. It might be a scanned image."
             
         return text
+    except PdfPasswordError as e:
+        return f"Error: {e}"
     except Exception as e:
         logging.error(f"PDF reading error: {e}")
         return f"Error reading PDF: {str(e)}"
 
+@traced()
 def get_chart_data(student_data):
     """
     Extracts numeric data for visualization.
-    Only works for DataFrames (CSV/Excel), returns None for Text/PDF.
+    Works for DataFrames (CSV/Excel) and StreamingSummary, returns None for Text/PDF.
     """
-    if not isinstance(student_data, pd.DataFrame):
-        return None
-
     try:
-        numeric_df = student_data.select_dtypes(include=['number'])
-        grade_cols = []
-        for col in numeric_df.columns:
+        if isinstance(student_data, StreamingSummary):
+            all_averages = student_data.means()
+        elif isinstance(student_data, pd.DataFrame):
+            all_averages = student_data.select_dtypes(include=['number']).mean().to_dict()
+        else:
+            return None
+
+        averages = {}
+        for col, value in all_averages.items():
             if 'id' in col or 'phone' in col or 'zip' in col or 'year' in col:
                 continue
-            grade_cols.append(col)
+            averages[col] = value
         
-        if not grade_cols:
+        if not averages:
             return None
-
-        averages = numeric_df[grade_cols].mean().to_dict()
         
         chart_data = {
             'labels': [col.replace('_', ' ').title() for col in averages.keys()],
@@ -0,0 +1,157 @@
+import os
+import re
+import time
+import random
+import hashlib
+import threading
+
+# Offline stand-in for genai.GenerativeModel, for load tests and benchmarks.
+# Select it with ANALYZER_MODEL_BACKEND=fake; no API key or network is needed.
+#
+#   FAKE_LATENCY      fixed:S | uniform:A,B | normal:MEAN,SD | lognormal:MEDIAN,SIGMA (seconds)
+#   FAKE_ERROR_RATE   probability that a call fails (0-1)
+#   FAKE_ERRORS       comma list of injected failures: quota, timeout, 500, 503, invalid
+#   FAKE_STREAM_CHUNKS number of chunks a streamed response is split into
+#   FAKE_SEED         seed for latency/error draws (text output is always seeded by the prompt)
+FAKE_LATENCY = os.getenv("FAKE_LATENCY", "lognormal:1.0,0.3")
+FAKE_ERROR_RATE = float(os.getenv("FAKE_ERROR_RATE", 0))
+FAKE_ERRORS = os.getenv("FAKE_ERRORS", "quota,timeout,500")
+FAKE_STREAM_CHUNKS = int(os.getenv("FAKE_STREAM_CHUNKS", 8))
+FAKE_SEED = os.getenv("FAKE_SEED")
+
+_WORDS = (
+    "consistent strong improving steady attention practice review focus effort progress "
+    "homework participation concepts fundamentals revision support target confidence "
+    "accuracy problem-solving reading writing analysis mentoring goals weekly feedback"
+).split()
+
+def parse_latency(spec):
+    """Turns a FAKE_LATENCY spec into a function rng -> seconds."""
+    kind, _, params = spec.partition(':')
+    values = [float(v) for v in params.split(',') if v.strip()] if params else []
+    kind = kind.strip().lower()
+    if kind == 'fixed':
+        return lambda rng: values[0] if values else 0.0
+    if kind == 'uniform':
+        return lambda rng: rng.uniform(values[0], values[1])
+    if kind == 'normal':
+        return lambda rng: max(0.0, rng.gauss(values[0], values[1]))
+    if kind == 'lognormal':
+        import math
+        mu = math.log(values[0])
+        return lambda rng: rng.lognormvariate(mu, values[1])
+    raise ValueError(f"Unknown FAKE_LATENCY distribution: {spec}")
+
+def _make_error(kind):
+    """Builds the exception the real SDK would raise, so retry classification behaves the same."""
+    try:
+        from google.api_core import exceptions as api
+    except ImportError:
+        api = None
+
+    messages = {
+        'quota': "Resource has been exhausted (e.g. check quota). Please retry in 2s.",
+        'timeout': "Deadline Exceeded",
+        '500': "An internal error has occurred.",
+        '503': "The service is currently unavailable.",
+        'invalid': "Request contains an invalid argument.",
+    }
+    if api is not None:
+        classes = {
+            'quota': api.ResourceExhausted,
+            'timeout': api.DeadlineExceeded,
+            '500': api.InternalServerError,
+            '503': api.ServiceUnavailable,
+            'invalid': api.InvalidArgument,
+        }
+        return classes[kind](messages[kind])
+    error = RuntimeError(messages[kind])
+    error.code = {'quota': 429, 'timeout': 504, '500': 500, '503': 503, 'invalid': 400}[kind]
+    return error
+
+class FakeResponse:
+    def __init__(self, text):
+        self.text = text
+
+class FakeModel:
+    def __init__(self, model_name, latency=FAKE_LATENCY, error_rate=FAKE_ERROR_RATE,
+                 errors=FAKE_ERRORS, stream_chunks=FAKE_STREAM_CHUNKS, seed=FAKE_SEED):
+        self.model_name = f"fake/{model_name}"
+        self.error_rate = error_rate
+        self.errors = [e.strip() for e in errors.split(',') if e.strip()]
+        self.stream_chunks = max(1, stream_chunks)
+        self._latency = parse_latency(latency)
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self.calls = 0
+
+    def generate_content(self, prompt, generation_config=None, stream=False, **kwargs):
+        with self._lock:
+            self.calls += 1
+            delay = self._latency(self._rng)
+            error = None
+            if self.errors and self._rng.random() < self.error_rate:
+                error = _make_error(self._rng.choice(self.errors))
+
+        text = fake_response_text(prompt)
+        if stream:
+            return self._stream(text, delay, error)
+
+        time.sleep(delay)
+        if error is not None:
+            raise error
+        return FakeResponse(text)
+
+    def _stream(self, text, delay, error):
+        # Errors surface on the first chunk, like the real streaming API
+        step = len(text) // self.stream_chunks + 1
+        pause = delay / self.stream_chunks
+        for i in range(0, len(text), step):
+            time.sleep(pause)
+            if error is not None:
+                raise error
+            yield FakeResponse(text[i:i + step])
+
+class FakeBackend:
+    """Backend for gemini_analyzer's model registry; needs no credentials."""
+    name = 'fake'
+
+    def credentials(self):
+        return 'offline'
+
+    def configure(self, credentials):
+        pass
+
+    def create_model(self, model_name):
+        return FakeModel(model_name)
+
+def fake_response_text(prompt):
+    """Deterministic Markdown for a prompt: same prompt, same answer."""
+    rng = random.Random(int(hashlib.sha256(prompt.encode('utf-8')).hexdigest()[:16], 16))
+
+    def sentence(words=12):
+        return " ".join(rng.choice(_WORDS) for _ in range(words)).capitalize() + "."
+
+    students = _student_names(prompt)
+    if students:
+        return "\n\n".join(
+            f"### {name}\n* **Performance**: {sentence()}\n* **Action**: {sentence(8)}"
+            for name in students
+        )
+
+    headings = re.findall(r"^\s*(###\s+.+)$", prompt, re.MULTILINE) or ["### Summary"]
+    return "\n\n".join(f"{heading.strip()}\n* {sentence()}\n* {sentence(8)}" for heading in headings)
+
+def _student_names(prompt, limit=200):
+    """First-column values of the data table in an individual-analysis prompt."""
+    if "Analyze these students" not in prompt or "\nData:\n" not in prompt:
+        return []
+    lines = prompt.split("\nData:\n", 1)[1].strip().splitlines()
+    if lines and lines[0].startswith("All rows:"):
+        lines = lines[1:]
+    names = []
+    for line in lines[1:limit + 1]:
+        name = re.split(r"[,\t]", line, 1)[0].strip()
+        if name:
+            names.append(name)
+    return names
@@ -1,35 +1,341 @@
 import os
+import time
 import pandas as pd
-from dotenv import load_dotenv
+from dotenv import load_dotenv, find_dotenv
 import google.generativeai as genai
+from modules.response_cache import get_response_cache, make_cache_key
+from modules.resilience import call_with_retry
+from modules.rate_limiter import CHARS_PER_TOKEN, estimate_tokens, gemini_limiter
+from modules.prompt_encoding import encode_dataframe, encode_for_prompt, drop_identifier_columns
+from modules.fake_model import FakeBackend
+from modules.data_extractor import StreamingSummary
+from modules.tracing import traced, submit_in_context
 import logging
-import time
+import itertools
+import threading
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, as_completed, wait
 
 logging.basicConfig(level=logging.INFO, format='%(levelname)s: %(message)s')
 MAX_RETRIES = 3
-RETRY_DELAY = 2
+RETRY_DELAY = 2  # base delay; backoff doubles it per attempt with full jitter
+DEFAULT_MODEL = 'gemini-2.0-flash-001'
+PROMPT_VERSION = 1  # bump when a prompt template changes, so main.py's batch mode re-analyses unchanged files
+COMPARATIVE_NEEDS_TABLE = "Comparative analysis requires structured data (CSV/Excel). For PDF/Text, please use Individual or Resume mode."
+# Inputs comparative analysis can describe: a full table, or a CSV streamed into column statistics
+_STATS_TYPES = (pd.DataFrame, StreamingSummary)
+ANALYSIS_WORKERS = int(os.getenv("ANALYSIS_WORKERS", 4))
+ANALYSIS_TIMEOUT = int(os.getenv("ANALYSIS_TIMEOUT", 180))  # seconds, per task
+SHARD_TOKEN_BUDGET = int(os.getenv("SHARD_TOKEN_BUDGET", 6000))  # data tokens per shard prompt
+SHARD_CONCURRENCY = int(os.getenv("SHARD_CONCURRENCY", 4))
+ENV_CHECK_SECONDS = float(os.getenv("ENV_CHECK_SECONDS", 5))  # how often .env is checked for a rotated key
 
-def initialize_gemini():
-    try:
-        load_dotenv()
-        api_key = os.getenv("GOOGLE_API_KEY")
-        if not api_key:
+class AnalysisCancelled(Exception):
+    """Raised by a progress callback to stop an analysis; never turned into result text."""
+
+class GeminiBackend:
+    """
+    Model backend interface. A backend supplies credentials (None means "not
+    configured"), applies them once, and creates model objects that expose
+    generate_content(prompt, generation_config=None, stream=False) and model_name.
+    """
+    name = 'gemini'
+
+    def credentials(self):
+        return os.getenv("GOOGLE_API_KEY")
+
+    def configure(self, credentials):
+        genai.configure(api_key=credentials)
+
+    def create_model(self, model_name):
+        return genai.GenerativeModel(model_name)
+
+_BACKENDS = {'gemini': GeminiBackend(), 'fake': FakeBackend()}
+
+def register_backend(backend):
+    """Makes a backend selectable through ANALYZER_MODEL_BACKEND=<backend.name>."""
+    _BACKENDS[backend.name] = backend
+
+class _ModelRegistry:
+    """
+    Process-wide pool of configured model instances, keyed by model name.
+    .env is re-read (overriding the environment) whenever its mtime changes,
+    checked at most every ENV_CHECK_SECONDS; a changed GOOGLE_API_KEY or
+    backend reconfigures the client and drops the cached models.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._models = {}
+        self._configured = None  # (backend name, credentials)
+        self._env_loaded = False
+        self._env_mtime = None
+        self._env_checked = 0.0
+        self.hits = 0
+        self.misses = 0
+        self.reloads = 0
+
+    def get(self, model_name=DEFAULT_MODEL):
+        self._check_env()
+
+        backend_name = os.getenv("ANALYZER_MODEL_BACKEND", "gemini")
+        backend = _BACKENDS.get(backend_name)
+        if backend is None:
+            raise ValueError(f"Unknown ANALYZER_MODEL_BACKEND '{backend_name}' (choose from {', '.join(_BACKENDS)})")
+        credentials = backend.credentials()
+        if not credentials:
             return None
-        genai.configure(api_key=api_key)
-        return genai.GenerativeModel('gemini-2.0-flash-001')
+
+        with self._lock:
+            if (backend.name, credentials) != self._configured:
+                if self._configured is not None:
+                    logging.info(f"Model backend or API key changed, reconfiguring '{backend.name}' client")
+                    self.reloads += 1
+                backend.configure(credentials)
+                self._configured = (backend.name, credentials)
+                self._models.clear()
+
+            model = self._models.get(model_name)
+            if model is None:
+                self.misses += 1
+                model = backend.create_model(model_name)
+                self._models[model_name] = model
+            else:
+                self.hits += 1
+            return model
+
+    def _check_env(self):
+        if self._env_loaded and time.monotonic() - self._env_checked < ENV_CHECK_SECONDS:
+            return
+        with self._lock:
+            if self._env_loaded and time.monotonic() - self._env_checked < ENV_CHECK_SECONDS:
+                return
+            path = find_dotenv()
+            mtime = os.path.getmtime(path) if path else None
+            if not self._env_loaded:
+                # First load: variables already set in the environment win, as usual
+                load_dotenv(path or None)
+            elif mtime != self._env_mtime and path:
+                logging.info(".env changed, reloading it")
+                load_dotenv(path, override=True)
+            self._env_loaded = True
+            self._env_mtime = mtime
+            self._env_checked = time.monotonic()
+
+    def reload(self):
+        """Re-read .env (overriding the environment) and rebuild models on next use."""
+        with self._lock:
+            path = find_dotenv()
+            load_dotenv(path or None, override=True)
+            self._env_loaded = True
+            self._env_mtime = os.path.getmtime(path) if path else None
+            self._env_checked = time.monotonic()
+            self._configured = None
+            self._models.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'backend': self._configured[0] if self._configured else None,
+                'hits': self.hits,
+                'misses': self.misses,
+                'reloads': self.reloads,
+                'models': sorted(self._models),
+            }
+
+_registry = _ModelRegistry()
+
+def initialize_gemini(model_name=DEFAULT_MODEL):
+    """
+    Returns the shared model for model_name, or None if no API key is configured.
+    Set ANALYZER_MODEL_BACKEND=fake to use the offline stand-in (modules/fake_model.py).
+    """
+    try:
+        return _registry.get(model_name)
     except Exception as e:
         logging.error(f"Gemini initialization error: {e}")
         return None
 
-def analyze_student_data(student_data):
+def reload_gemini():
+    """Force the registry to pick up a new API key from .env."""
+    _registry.reload()
+
+def get_model_stats():
+    return _registry.stats()
+
+_analysis_pool = ThreadPoolExecutor(max_workers=ANALYSIS_WORKERS, thread_name_prefix='analysis')
+_START_POLL_SECONDS = 0.5
+
+def run_analyses(tasks, timeout=ANALYSIS_TIMEOUT, on_result=None):
+    """
+    Runs independent analyses concurrently on a shared, bounded thread pool.
+
+    Args:
+        tasks (dict): result key -> (function, *args), e.g.
+                      {'standard': (analyze_student_data, df)}
+        timeout (float): seconds each task may run, counted from when it
+                         starts (time queued behind other requests is free)
+        on_result (callable): Optional fn(key, text) called as each task finishes
+
+    Returns:
+        dict: result key -> analysis text, in the same order as tasks.
+              A task that times out or raises yields an "Error: ..." string.
+    """
+    started = {}
+
+    def run(key, func, *args):
+        started[key] = time.monotonic()
+        return func(*args)
+
+    futures = {submit_in_context(_analysis_pool, run, key, func, *args): key for key, (func, *args) in tasks.items()}
+
+    finished = {}
+    pending = set(futures)
+    while pending:
+        deadlines = [started[futures[f]] + timeout for f in pending if futures[f] in started]
+        # Until a task starts there is no deadline to wait for, so poll for one starting
+        wait_for = max(0.0, min(deadlines) - time.monotonic()) if deadlines else _START_POLL_SECONDS
+        done, pending = wait(pending, timeout=wait_for, return_when=FIRST_COMPLETED)
+        for future in done:
+            key = futures[future]
+            try:
+                finished[key] = future.result()
+            except AnalysisCancelled:
+                for other in pending:
+                    other.cancel()
+                raise
+            except Exception as e:
+                logging.error(f"Analysis '{key}' failed: {e}")
+                finished[key] = f"Error: {str(e)}"
+            if on_result:
+                on_result(key, finished[key])
+
+        now = time.monotonic()
+        for future in [f for f in pending if futures[f] in started and now - started[futures[f]] >= timeout]:
+            # A running thread cannot be stopped; its eventual result is discarded
+            pending.discard(future)
+            future.cancel()
+            key = futures[future]
+            logging.error(f"Analysis '{key}' timed out after {timeout}s")
+            finished[key] = f"Error: {key} analysis timed out after {timeout} seconds."
+            if on_result:
+                on_result(key, finished[key])
+
+    return {key: finished[key] for key in tasks}
+
+def build_analysis_tasks(data_source, analysis_type, progress_callback=None):
+    """
+    Maps an analysis mode (1 individual, 2 comparative, 3 both, 4 resume) to
+    run_analyses() tasks.
+
+    Returns:
+        tuple: (tasks, results) where results holds answers that need no model call.
+    """
+    tasks = {}
+    results = {}
+    if analysis_type == 4:
+        tasks['resume'] = (analyze_resume, data_source)
+        return tasks, results
+
+    if analysis_type in [1, 3]:
+        tasks['standard'] = (analyze_student_data, data_source, progress_callback)
+
+    if analysis_type in [2, 3]:
+        if isinstance(data_source, _STATS_TYPES):
+            tasks['comparative'] = (generate_comparative_analysis, data_source)
+        elif analysis_type == 2:
+            results['comparative'] = COMPARATIVE_NEEDS_TABLE
+    return tasks, results
+
+# Shards get their own pool: analyze_student_data itself runs on _analysis_pool,
+# and waiting on that same pool from inside it could deadlock.
+_shard_pool = ThreadPoolExecutor(max_workers=SHARD_CONCURRENCY, thread_name_prefix='shard')
+
+def analyze_student_data(student_data, progress_callback=None):
+    """
+    Individual analysis for every student. Large rosters are split into
+    token-budgeted shards that are analysed in parallel (map) and then
+    stitched back together in roster order (reduce).
+
+    Args:
+        student_data (pd.DataFrame | str): Roster or free text
+        progress_callback (callable): Optional fn(done, total) called as shards finish
+
+    Returns:
+        str: Markdown analysis
+    """
     model = initialize_gemini()
     if not model: return "Error: API Key missing."
     try:
-        prompt = _create_analysis_prompt(student_data)
-        return _generate_with_retry(model, prompt)
+        if not isinstance(student_data, pd.DataFrame):
+            prompt = _create_analysis_prompt(student_data)
+            result = _generate_with_retry(model, prompt)
+            if progress_callback:
+                progress_callback(1, 1)
+            return result
+
+        shards = split_into_shards(student_data)
+        total = len(shards)
+        if total == 1:
+            result = _generate_with_retry(model, _create_analysis_prompt(shards[0]))
+            if progress_callback:
+                progress_callback(1, 1)
+            return result
+
+        logging.info(f"Analysing {len(student_data)} rows in {total} shards")
+        futures = {
+            submit_in_context(_shard_pool, _analyze_shard, model, shard, i, total): i
+            for i, shard in enumerate(shards)
+        }
+        parts = [None] * total
+        try:
+            for done, future in enumerate(as_completed(futures), start=1):
+                parts[futures[future]] = future.result()
+                if progress_callback:
+                    progress_callback(done, total)
+        except AnalysisCancelled:
+            # Shards still queued are dropped; ones already running finish on their own
+            for future in futures:
+                future.cancel()
+            raise
+        return _merge_shard_reports(shards, parts)
+    except AnalysisCancelled:
+        raise
     except Exception as e:
         return f"Error: {str(e)}"
 
+def split_into_shards(student_data, token_budget=SHARD_TOKEN_BUDGET):
+    """
+    Splits a DataFrame into row ranges whose rendered size fits token_budget.
+    Row width is estimated from a sample so large rosters are not rendered twice.
+    """
+    if student_data.empty:
+        return [student_data]
+    sample = encode_dataframe(student_data.head(20))
+    lines = sample.splitlines()
+    chars_per_row = max(1, max(len(line) for line in lines[1:]) if len(lines) > 1 else len(sample))
+    rows_per_shard = max(1, (token_budget * CHARS_PER_TOKEN) // (chars_per_row + 1))
+    return [
+        student_data.iloc[start:start + rows_per_shard]
+        for start in range(0, len(student_data), rows_per_shard)
+    ]
+
+def _analyze_shard(model, shard, index, total):
+    try:
+        prompt = _create_analysis_prompt(shard, part=(index + 1, total))
+        return _generate_with_retry(model, prompt)
+    except Exception as e:
+        logging.error(f"Shard {index + 1}/{total} failed: {e}")
+        return f"Error: shard {index + 1} could not be analysed ({str(e)})."
+
+def _shard_section(shards, index, text):
+    """Markdown for one shard, headed by the roster rows it covers."""
+    first_row = sum(len(shard) for shard in shards[:index]) + 1
+    last_row = first_row + len(shards[index]) - 1
+    return f"## Students {first_row}-{last_row}\n\n{(text or '').strip()}"
+
+def _merge_shard_reports(shards, parts):
+    """Joins per-shard Markdown in roster order, labelling each row range."""
+    return "\n\n".join(_shard_section(shards, i, text) for i, text in enumerate(parts))
+
 def generate_comparative_analysis(student_data):
     model = initialize_gemini()
     if not model: return "Error: API Key missing."
@@ -39,14 +345,34 @@ def generate_comparative_analysis(student_data):
     except Exception as e:
         return f"Error: {str(e)}"
 
+def generate_cross_class_analysis(class_summaries):
+    """
+    One comparative report across several classes (e.g. a batch upload).
+
+    Args:
+        class_summaries (dict): class name -> StreamingSummary
+    """
+    model = initialize_gemini()
+    if not model: return "Error: API Key missing."
+    try:
+        return _generate_with_retry(model, _create_cross_class_prompt(class_summaries))
+    except Exception as e:
+        return f"Error: {str(e)}"
+
 def analyze_resume(resume_text):
     """Specific function for analyzing resumes."""
     model = initialize_gemini()
     if not model: return "Error: API Key missing."
     try:
-        # Truncate if too long
-        text = str(resume_text)[:15000]
-        prompt = f"""You are an expert Career Coach and HR Manager. Analyze this resume/CV.
+        return _generate_with_retry(model, _create_resume_prompt(resume_text))
+    except Exception as e:
+        return f"Error analyzing resume: {str(e)}"
+
+@traced()
+def _create_resume_prompt(resume_text):
+    # Truncate if too long
+    text = str(resume_text)[:15000]
+    return f"""You are an expert Career Coach and HR Manager. Analyze this resume/CV.
         
         Please provide the output in the following Markdown format:
 
@@ -69,25 +395,246 @@ def analyze_resume(resume_text):
         Resume Content:
         "{text}"
         """
-        return _generate_with_retry(model, prompt)
-    except Exception as e:
-        return f"Error analyzing resume: {str(e)}"
 
-def _generate_with_retry(model, prompt):
-    for attempt in range(MAX_RETRIES):
+def generate_text(prompt, model_name=DEFAULT_MODEL):
+    """Free-form generation for routes that build their own prompt (e.g. career guide)."""
+    model = initialize_gemini(model_name)
+    if not model:
+        return None
+    return _generate_with_retry(model, prompt)
+
+def get_cache_stats():
+    cache = get_response_cache()
+    return cache.stats() if cache else {'enabled': False}
+
+class _Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+class _SingleFlight:
+    """
+    Coalesces concurrent calls with the same key: the first caller runs the
+    function, later callers block until it finishes and share its result
+    (or its exception).
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._flights = {}
+        self.leaders = 0
+        self.coalesced = 0
+
+    def do(self, key, func):
+        with self._lock:
+            flight = self._flights.get(key)
+            if flight is None:
+                flight = self._flights[key] = _Flight()
+                self.leaders += 1
+                leader = True
+            else:
+                flight.waiters += 1
+                self.coalesced += 1
+                leader = False
+
+        if not leader:
+            return self._wait(flight)
+
         try:
-            response = model.generate_content(prompt)
-            return response.text
+            flight.result = func()
+            return flight.result
         except Exception as e:
-            if attempt < MAX_RETRIES - 1:
-                time.sleep(RETRY_DELAY)
-            else:
-                raise e
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+            flight.done.set()
+
+    def join(self, key):
+        """Waits for an in-flight call with this key. Returns (True, result) or (False, None)."""
+        with self._lock:
+            flight = self._flights.get(key)
+            if flight is None:
+                return False, None
+            flight.waiters += 1
+            self.coalesced += 1
+        return True, self._wait(flight)
+
+    def _wait(self, flight):
+        flight.done.wait()
+        if flight.error is not None:
+            raise flight.error
+        return flight.result
+
+    def stats(self):
+        with self._lock:
+            return {
+                'leaders': self.leaders,
+                'coalesced_waiters': self.coalesced,
+                'in_flight': len(self._flights),
+                'waiting_now': sum(f.waiters for f in self._flights.values()),
+            }
+
+_in_flight = _SingleFlight()
+
+def get_coalescing_stats():
+    return _in_flight.stats()
+
+@traced()
+def _generate_with_retry(model, prompt, generation_config=None):
+    cache = get_response_cache()
+    cache_key = make_cache_key(getattr(model, 'model_name', DEFAULT_MODEL), prompt, generation_config)
+    if cache:
+        cached = cache.get(cache_key)
+        if cached is not None:
+            return cached
+
+    tokens = estimate_tokens(prompt)
+
+    def attempt():
+        return model.generate_content(prompt, generation_config=generation_config).text
+
+    def generate():
+        text = call_with_retry(attempt, MAX_RETRIES, RETRY_DELAY, acquire=lambda: gemini_limiter.acquire(tokens))
+        # Cache before the flight ends so a caller arriving just after still avoids a round trip
+        if cache:
+            cache.put(cache_key, text)
+        return text
 
-def _create_analysis_prompt(student_data):
+    # Identical prompts already in flight (e.g. a whole class pressing Analyze) share one request
+    return _in_flight.do(cache_key, generate)
+
+def _stream_with_retry(model, prompt, generation_config=None):
+    """
+    Yields response text chunks as Gemini produces them. Retries are only
+    possible until the first chunk arrives; after that errors propagate.
+    """
+    cache = get_response_cache()
+    cache_key = make_cache_key(getattr(model, 'model_name', DEFAULT_MODEL), prompt, generation_config)
+    if cache:
+        cached = cache.get(cache_key)
+        if cached is not None:
+            yield cached
+            return
+
+    # Piggy-back on an identical blocking request that is already running
+    joined, text = _in_flight.join(cache_key)
+    if joined:
+        yield text
+        return
+
+    tokens = estimate_tokens(prompt)
+
+    def open_stream():
+        # Connection, quota and prompt errors surface on the first chunk
+        chunks = iter(model.generate_content(prompt, generation_config=generation_config, stream=True))
+        return next(chunks, None), chunks
+
+    first, chunks = call_with_retry(open_stream, MAX_RETRIES, RETRY_DELAY,
+                                    acquire=lambda: gemini_limiter.acquire(tokens))
+    if first is None:
+        return
+
+    parts = []
+    for chunk in itertools.chain([first], chunks):
+        text = chunk.text
+        if text:
+            parts.append(text)
+            yield text
+    if cache:
+        cache.put(cache_key, "".join(parts))
+
+def stream_text(prompt, model_name=DEFAULT_MODEL):
+    """Streaming counterpart of generate_text(); yields nothing if no API key is configured."""
+    model = initialize_gemini(model_name)
+    if not model:
+        return
+    yield from _stream_with_retry(model, prompt)
+
+def stream_analysis(student_data, analysis_type=3):
+    """
+    Streams an analysis as (event, data) pairs for Server-Sent Events:
+        ('section', {'name': key})         - a new results section begins
+        ('chunk', {'text': str})           - Markdown to append to the current section
+        ('progress', {'done', 'total'})    - roster shards finished so far
+        ('error', {'error': str})          - the current section failed
+
+    Section keys match the results dict of /api/analyze ('standard',
+    'comparative', 'resume'). In mode 3 the comparative analysis runs in the
+    background while the individual analysis streams.
+    """
+    model = initialize_gemini()
+    if not model:
+        yield 'error', {'error': "API Key missing."}
+        return
+
+    if analysis_type == 4:
+        yield 'section', {'name': 'resume'}
+        yield from _stream_section(model, _create_resume_prompt(student_data))
+        return
+
+    is_table = isinstance(student_data, pd.DataFrame)
+    has_stats = isinstance(student_data, _STATS_TYPES)
+    comparative = None
+    if analysis_type == 3 and has_stats:
+        comparative = submit_in_context(_analysis_pool, generate_comparative_analysis, student_data)
+
+    if analysis_type in [1, 3]:
+        yield 'section', {'name': 'standard'}
+        shards = split_into_shards(student_data) if is_table else None
+        if shards and len(shards) > 1:
+            yield from _stream_shards(model, shards)
+        else:
+            yield from _stream_section(model, _create_analysis_prompt(student_data))
+
+    if analysis_type in [2, 3]:
+        if comparative is not None:
+            yield 'section', {'name': 'comparative'}
+            try:
+                yield 'chunk', {'text': comparative.result(timeout=ANALYSIS_TIMEOUT)}
+            except Exception as e:
+                yield 'error', {'error': str(e)}
+        elif has_stats:
+            yield 'section', {'name': 'comparative'}
+            yield from _stream_section(model, _create_comparative_prompt(student_data))
+        elif analysis_type == 2:
+            yield 'section', {'name': 'comparative'}
+            yield 'chunk', {'text': COMPARATIVE_NEEDS_TABLE}
+
+def _stream_section(model, prompt):
+    try:
+        for text in _stream_with_retry(model, prompt):
+            yield 'chunk', {'text': text}
+    except Exception as e:
+        logging.error(f"Streaming generation failed: {e}")
+        yield 'error', {'error': str(e)}
+
+def _stream_shards(model, shards):
+    """Runs shards in parallel and emits each one as soon as every earlier shard is done."""
+    total = len(shards)
+    futures = {
+        submit_in_context(_shard_pool, _analyze_shard, model, shard, i, total): i
+        for i, shard in enumerate(shards)
+    }
+    parts = [None] * total
+    next_index = 0
+    for done, future in enumerate(as_completed(futures), start=1):
+        parts[futures[future]] = future.result()
+        yield 'progress', {'done': done, 'total': total}
+        while next_index < total and parts[next_index] is not None:
+            separator = "\n\n" if next_index else ""
+            yield 'chunk', {'text': separator + _shard_section(shards, next_index, parts[next_index])}
+            next_index += 1
+
+@traced()
+def _create_analysis_prompt(student_data, part=None):
     if isinstance(student_data, pd.DataFrame):
-        data_str = student_data.head(50).to_string()
-        return f"""Analyze these students. Markdown format:
+        # Callers shard large rosters first (split_into_shards), so render every row
+        data_str = encode_for_prompt(student_data, 'Analysis')
+        scope = f"This is part {part[0]} of {part[1]} of the class roster. " if part else ""
+        return f"""{scope}Analyze these students. Markdown format:
 ### Student Name
 * **Performance**: [Summary]
 * **Action**: [Recommendation]
@@ -109,9 +656,13 @@ Content:
 "{text_content}"
 """
 
+@traced()
 def _create_comparative_prompt(student_data):
-    if isinstance(student_data, pd.DataFrame):
-        desc = student_data.describe().to_string()
+    if isinstance(student_data, _STATS_TYPES):
+        desc = encode_for_prompt(
+            drop_identifier_columns(student_data.describe(), require_name=False), 'Comparative',
+            include_index=True, drop_constant=False, drop_identifiers=False,
+        )
         return f"""Analyze class stats. Markdown format:
 ### Class Overview
 [Summary]
@@ -123,4 +674,34 @@ def _create_comparative_prompt(student_data):
 Stats:
 {desc}
 """
-    return "Comparative analysis requires structured data."
\ No newline at end of file
+    return "Comparative analysis requires structured data."
+
+@traced()
+def _create_cross_class_prompt(class_summaries):
+    # from_dict leaves out classes with no numeric columns; reindex keeps every class, with blank means
+    names = list(class_summaries)
+    means = pd.DataFrame.from_dict({name: summary.means() for name, summary in class_summaries.items()}, orient='index')
+    means = drop_identifier_columns(means.reindex(names), require_name=False)
+    means.insert(0, 'students', [class_summaries[name].rows for name in means.index])
+    combined = StreamingSummary()
+    for summary in class_summaries.values():
+        combined.merge(summary)
+    per_class = encode_for_prompt(means, 'Cross-class', include_index=True, drop_constant=False, drop_identifiers=False)
+    overall = encode_for_prompt(
+        drop_identifier_columns(combined.describe(), require_name=False), 'Cross-class',
+        include_index=True, drop_constant=False, drop_identifiers=False,
+    )
+    return f"""Compare these classes. Markdown format:
+### Overview
+[Summary]
+### Class Differences
+* **[Class]**: [Strength or gap]
+### Strategy
+* [Tip]
+
+Mean per class:
+{per_class}
+
+All classes combined:
+{overall}
+"""
\ No newline at end of file
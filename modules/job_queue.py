@@ -0,0 +1,309 @@
+import os
+import json
+import time
+import uuid
+import socket
+import sqlite3
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from modules.data_extractor import read_data, get_chart_data
+from modules.gemini_analyzer import build_analysis_tasks, run_analyses, AnalysisCancelled
+from modules.upload_sessions import read_upload, get_upload_store, UploadIdle
+
+# Background analysis jobs. State lives in SQLite so any gunicorn worker can
+# answer status polls, and jobs interrupted by a restart are picked up again.
+JOBS_DIR = os.getenv("JOBS_DIR", os.path.join('outputs', 'jobs'))
+JOB_MAX_CONCURRENT = int(os.getenv("JOB_MAX_CONCURRENT", 2))
+# Chunked-upload jobs start before their last part arrives and mostly wait on
+# the client, so they run in their own lane and never hold the slots above.
+UPLOAD_JOB_MAX_CONCURRENT = int(os.getenv("UPLOAD_JOB_MAX_CONCURRENT", 4))
+
+STATUS_QUEUED = 'queued'
+STATUS_RUNNING = 'running'
+STATUS_COMPLETED = 'completed'
+STATUS_FAILED = 'failed'
+STATUS_CANCELLED = 'cancelled'
+FINAL_STATUSES = (STATUS_COMPLETED, STATUS_FAILED, STATUS_CANCELLED)
+
+_HOST = socket.gethostname()
+
+class JobCancelled(AnalysisCancelled):
+    pass
+
+class JobQueue:
+    def __init__(self, directory=JOBS_DIR, max_concurrent=JOB_MAX_CONCURRENT,
+                 upload_max_concurrent=UPLOAD_JOB_MAX_CONCURRENT):
+        self.max_concurrent = max_concurrent
+        self.upload_max_concurrent = upload_max_concurrent
+        self.input_dir = os.path.join(directory, 'inputs')
+        self.db_path = os.path.join(directory, 'jobs.db')
+        os.makedirs(self.input_dir, exist_ok=True)
+        self._pool = ThreadPoolExecutor(max_workers=max_concurrent, thread_name_prefix='job')
+        self._upload_pool = ThreadPoolExecutor(max_workers=upload_max_concurrent, thread_name_prefix='upload-job')
+
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                " id TEXT PRIMARY KEY, status TEXT NOT NULL, analysis_type INTEGER NOT NULL,"
+                " filename TEXT, input_path TEXT, input_text TEXT,"
+                " stage TEXT, progress TEXT, results TEXT, chart_data TEXT, timings TEXT, error TEXT,"
+                " cancel_requested INTEGER NOT NULL DEFAULT 0, owner TEXT,"
+                " created REAL NOT NULL, started REAL, finished REAL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_status ON jobs (status, created)")
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(jobs)")}
+            if 'upload_id' not in columns:
+                conn.execute("ALTER TABLE jobs ADD COLUMN upload_id TEXT")
+
+        self._recover_orphans()
+
+    def _connect(self):
+        return sqlite3.connect(self.db_path, timeout=30)
+
+    # --- Public API ---
+
+    def submit(self, analysis_type, input_path=None, input_text=None, filename=None, upload_id=None, job_id=None):
+        """
+        Queues a job and returns its id immediately. With upload_id the input
+        is a chunked upload (input_path is its spool file), which may still be
+        arriving when the job starts. job_id is for an id already handed out.
+        """
+        job_id = job_id or uuid.uuid4().hex
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO jobs (id, status, analysis_type, filename, input_path, input_text, upload_id, created)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (job_id, STATUS_QUEUED, analysis_type, filename, input_path, input_text, upload_id, time.time()),
+            )
+        self._lane_pool(upload_id is not None).submit(self._drain, upload_id is not None)
+        return job_id
+
+    def upload_path(self, filename):
+        """A unique path for saving a job's upload, so same-named files never collide."""
+        return os.path.join(self.input_dir, f"{uuid.uuid4().hex}_{filename}")
+
+    def get(self, job_id):
+        with self._connect() as conn:
+            conn.row_factory = sqlite3.Row
+            row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+
+        now = time.time()
+        started = row['started']
+        finished = row['finished']
+        return {
+            'id': row['id'],
+            'status': row['status'],
+            'stage': row['stage'],
+            'analysis_type': row['analysis_type'],
+            'filename': row['filename'],
+            'progress': json.loads(row['progress']) if row['progress'] else None,
+            'text_results': json.loads(row['results']) if row['results'] else {},
+            'chart_data': json.loads(row['chart_data']) if row['chart_data'] else None,
+            'timings': json.loads(row['timings']) if row['timings'] else {},
+            'error': row['error'],
+            'cancel_requested': bool(row['cancel_requested']),
+            'created': row['created'],
+            'started': started,
+            'finished': finished,
+            'queued_seconds': round((started or now) - row['created'], 3),
+            'elapsed_seconds': round((finished or now) - started, 3) if started else None,
+        }
+
+    def cancel(self, job_id):
+        """
+        Cancels a job. Queued jobs stop immediately; running jobs stop at the
+        next stage boundary or roster shard.
+
+        Returns:
+            bool: False if the job does not exist or has already finished
+        """
+        with self._connect() as conn:
+            row = conn.execute("SELECT status FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            if row is None or row[0] in FINAL_STATUSES:
+                return False
+            if row[0] == STATUS_QUEUED:
+                updated = conn.execute(
+                    "UPDATE jobs SET status = ?, finished = ? WHERE id = ? AND status = ?",
+                    (STATUS_CANCELLED, time.time(), job_id, STATUS_QUEUED),
+                ).rowcount
+                if updated:
+                    self._remove_input(conn, job_id)
+                    return True
+            conn.execute("UPDATE jobs SET cancel_requested = 1 WHERE id = ?", (job_id,))
+            return True
+
+    def stats(self):
+        with self._connect() as conn:
+            counts = dict(conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
+        return {'max_concurrent': self.max_concurrent, 'upload_max_concurrent': self.upload_max_concurrent,
+                'jobs': counts}
+
+    # --- Worker side ---
+
+    def _lane_pool(self, uploads):
+        return self._upload_pool if uploads else self._pool
+
+    def _drain(self, uploads=False):
+        """Claims and runs queued jobs of one lane until none are left or its global cap is reached."""
+        while True:
+            job = self._claim(uploads)
+            if job is None:
+                return
+            self._run(job)
+
+    def _claim(self, uploads=False):
+        claim = f"{_HOST}:{os.getpid()}:{uuid.uuid4().hex}"
+        lane = "upload_id IS NOT NULL" if uploads else "upload_id IS NULL"
+        limit = self.upload_max_concurrent if uploads else self.max_concurrent
+        with self._connect() as conn:
+            # Single UPDATE so two workers can never claim the same job, and the
+            # lane's running count is checked in the same write transaction.
+            claimed = conn.execute(
+                "UPDATE jobs SET status = ?, owner = ?, started = ?, stage = 'starting'"
+                f" WHERE id = (SELECT id FROM jobs WHERE status = ? AND {lane} ORDER BY created LIMIT 1)"
+                f" AND (SELECT COUNT(*) FROM jobs WHERE status = ? AND {lane}) < ?",
+                (STATUS_RUNNING, claim, time.time(), STATUS_QUEUED, STATUS_RUNNING, limit),
+            ).rowcount
+            if not claimed:
+                return None
+            conn.row_factory = sqlite3.Row
+            return conn.execute("SELECT * FROM jobs WHERE owner = ?", (claim,)).fetchone()
+
+    def _run(self, job):
+        job_id = job['id']
+        timings = {}
+        results = {}
+
+        def check_cancelled():
+            with self._connect() as conn:
+                flag = conn.execute("SELECT cancel_requested FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            if flag and flag[0]:
+                raise JobCancelled()
+
+        def set_stage(stage, **fields):
+            check_cancelled()
+            self._update(job_id, stage=stage, timings=json.dumps(timings), **fields)
+
+        def on_progress(done, total):
+            check_cancelled()
+            self._update(job_id, progress=json.dumps({'done': done, 'total': total}))
+
+        def on_result(key, text):
+            results[key] = text
+            self._update(job_id, results=json.dumps(results))
+
+        analysis_type = job['analysis_type']
+        try:
+            set_stage('read_data')
+            start = time.perf_counter()
+            if job['upload_id']:
+                data_source = read_upload(job['upload_id'], stats_only=analysis_type == 2, on_wait=check_cancelled)
+                if data_source is None:
+                    raise ValueError('Could not process file. Valid formats: CSV, Excel, PDF, Text.')
+            elif job['input_path']:
+                data_source = read_data(job['input_path'], stats_only=analysis_type == 2)
+                if data_source is None:
+                    raise ValueError('Could not process file. Valid formats: CSV, Excel, PDF, Text.')
+            else:
+                data_source = job['input_text']
+            timings['read_data'] = round(time.perf_counter() - start, 4)
+
+            if not isinstance(data_source, str):
+                if analysis_type == 4:
+                    data_source = data_source.to_string()
+                else:
+                    set_stage('chart_data')
+                    start = time.perf_counter()
+                    chart_data = get_chart_data(data_source)
+                    timings['chart_data'] = round(time.perf_counter() - start, 4)
+                    self._update(job_id, chart_data=json.dumps(chart_data))
+
+            set_stage('analysis')
+            start = time.perf_counter()
+            tasks, static_results = build_analysis_tasks(data_source, analysis_type, on_progress)
+            for key, text in static_results.items():
+                on_result(key, text)
+            run_analyses(tasks, on_result=on_result)
+            timings['analysis'] = round(time.perf_counter() - start, 4)
+
+            check_cancelled()
+            self._finish(job_id, STATUS_COMPLETED, timings=json.dumps(timings))
+        except JobCancelled:
+            logging.info(f"Job {job_id} cancelled")
+            self._finish(job_id, STATUS_CANCELLED, timings=json.dumps(timings))
+        except UploadIdle as e:
+            # The upload is still open: keep its spool for the job its next part starts
+            logging.info(f"Job {job_id} stopped waiting for upload {job['upload_id']}")
+            self._update(job_id, input_path=None)
+            get_upload_store().release_job(job['upload_id'], job_id)
+            self._finish(job_id, STATUS_FAILED, error=str(e), timings=json.dumps(timings))
+        except Exception as e:
+            logging.error(f"Job {job_id} failed: {e}")
+            self._finish(job_id, STATUS_FAILED, error=str(e), timings=json.dumps(timings))
+
+    def _update(self, job_id, **fields):
+        columns = ", ".join(f"{name} = ?" for name in fields)
+        with self._connect() as conn:
+            conn.execute(f"UPDATE jobs SET {columns} WHERE id = ?", (*fields.values(), job_id))
+
+    def _finish(self, job_id, status, **fields):
+        self._update(job_id, status=status, stage=None, finished=time.time(), **fields)
+        with self._connect() as conn:
+            self._remove_input(conn, job_id)
+
+    def _remove_input(self, conn, job_id):
+        row = conn.execute("SELECT input_path FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row and row[0] and os.path.exists(row[0]):
+            try:
+                os.remove(row[0])
+            except OSError as e:
+                logging.warning(f"Could not remove job input {row[0]}: {e}")
+
+    def _recover_orphans(self):
+        """Re-queues jobs whose owning process on this host no longer exists."""
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT id, owner FROM jobs WHERE status = ?", (STATUS_RUNNING,)
+            ).fetchall()
+            for job_id, owner in rows:
+                host, _, rest = (owner or '').partition(':')
+                pid = rest.split(':', 1)[0]
+                if host == _HOST and pid.isdigit() and not _pid_alive(int(pid)):
+                    logging.info(f"Re-queuing job {job_id} interrupted by a worker restart")
+                    conn.execute(
+                        "UPDATE jobs SET status = ?, owner = NULL, started = NULL, stage = NULL"
+                        " WHERE id = ? AND owner = ?",
+                        (STATUS_QUEUED, job_id, owner),
+                    )
+            pending = dict(conn.execute(
+                "SELECT upload_id IS NOT NULL, COUNT(*) FROM jobs WHERE status = ? GROUP BY 1", (STATUS_QUEUED,)
+            ).fetchall())
+        for uploads, limit in ((False, self.max_concurrent), (True, self.upload_max_concurrent)):
+            for _ in range(min(pending.get(int(uploads), 0), limit)):
+                self._lane_pool(uploads).submit(self._drain, uploads)
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+_queue = None
+_queue_lock = threading.Lock()
+
+def get_job_queue():
+    """Returns the process-wide job queue, creating it on first use."""
+    global _queue
+    if _queue is None:
+        with _queue_lock:
+            if _queue is None:
+                _queue = JobQueue()
+    return _queue
@@ -0,0 +1,122 @@
+import os
+import glob
+import logging
+
+# Prometheus metrics, served by app.py at /metrics.
+# Under gunicorn, point PROMETHEUS_MULTIPROC_DIR at a writable directory: each
+# worker then writes its samples there and /metrics aggregates all of them.
+# gunicorn.conf.py clears the directory on startup and drops exited workers.
+# Without prometheus_client installed (or with METRICS_ENABLED=0) every metric
+# is a no-op and /metrics answers 503.
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1") != "0"
+MULTIPROC_DIR = os.getenv("PROMETHEUS_MULTIPROC_DIR")
+
+try:
+    import prometheus_client
+    from prometheus_client import multiprocess
+except ImportError:
+    prometheus_client = None
+
+AVAILABLE = METRICS_ENABLED and prometheus_client is not None
+
+# Known upload formats; anything else is reported as 'other' to bound label cardinality
+PARSE_FORMATS = {'csv', 'xlsx', 'xls', 'txt', 'pdf'}
+
+LATENCY_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+GEMINI_BUCKETS = (0.1, 0.25, 0.5, 1, 2, 4, 8, 16, 32, 64)
+PARSE_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 10, 30)
+SIZE_BUCKETS = (1e3, 1e4, 1e5, 1e6, 4e6, 16e6, 64e6, 256e6)
+
+class _NullMetric:
+    def labels(self, *args, **kwargs):
+        return self
+
+    def inc(self, amount=1):
+        pass
+
+    def observe(self, value):
+        pass
+
+_NULL_METRIC = _NullMetric()
+
+def _counter(name, documentation, labels):
+    if not AVAILABLE:
+        return _NULL_METRIC
+    return prometheus_client.Counter(name, documentation, labels)
+
+def _histogram(name, documentation, labels, buckets):
+    if not AVAILABLE:
+        return _NULL_METRIC
+    return prometheus_client.Histogram(name, documentation, labels, buckets=buckets)
+
+HTTP_REQUESTS = _counter(
+    'analyzer_http_requests_total', 'HTTP requests by route, method and status', ['endpoint', 'method', 'status'])
+HTTP_LATENCY = _histogram(
+    'analyzer_http_request_duration_seconds', 'Time until the response (including a streamed body) is closed',
+    ['endpoint', 'method'], LATENCY_BUCKETS)
+UPLOAD_SIZE = _histogram(
+    'analyzer_upload_size_bytes', 'Size of uploaded files', ['format'], SIZE_BUCKETS)
+PARSE_LATENCY = _histogram(
+    'analyzer_file_parse_duration_seconds', 'Time spent reading an uploaded file into a DataFrame or text',
+    ['format', 'outcome'], PARSE_BUCKETS)
+GEMINI_LATENCY = _histogram(
+    'analyzer_gemini_request_duration_seconds', 'Latency of single Gemini attempts (first chunk for streams)',
+    ['outcome'], GEMINI_BUCKETS)
+GEMINI_RETRIES = _counter(
+    'analyzer_gemini_retries_total', 'Gemini attempts that failed and were retried, by error class', ['error_class'])
+GEMINI_FAILURES = _counter(
+    'analyzer_gemini_failures_total', 'Gemini calls that failed after all retries, by error class', ['error_class'])
+
+def file_format(filename):
+    """Label value for a file name or extension: 'csv', 'pdf', ..., or 'other'."""
+    extension = (os.path.splitext(filename)[1] or filename).lower().lstrip('.')
+    return extension if extension in PARSE_FORMATS else 'other'
+
+def observe_request(endpoint, method, status, seconds):
+    HTTP_REQUESTS.labels(endpoint, method, str(status)).inc()
+    HTTP_LATENCY.labels(endpoint, method).observe(seconds)
+
+def observe_upload(filename, size):
+    UPLOAD_SIZE.labels(file_format(filename)).observe(size)
+
+def observe_parse(filename, seconds, ok):
+    PARSE_LATENCY.labels(file_format(filename), 'ok' if ok else 'error').observe(seconds)
+
+def observe_gemini_attempt(seconds, error_class=None):
+    GEMINI_LATENCY.labels(error_class or 'ok').observe(seconds)
+
+def count_gemini_retry(error_class):
+    GEMINI_RETRIES.labels(error_class).inc()
+
+def count_gemini_failure(error_class):
+    GEMINI_FAILURES.labels(error_class).inc()
+
+def render_metrics():
+    """
+    Returns (body, content_type, status) for the /metrics endpoint. In
+    multiprocess mode the samples of all workers are merged.
+    """
+    if not AVAILABLE:
+        return "# metrics disabled or prometheus_client not installed\n", 'text/plain; charset=utf-8', 503
+    if MULTIPROC_DIR:
+        registry = prometheus_client.CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = prometheus_client.REGISTRY
+    return prometheus_client.generate_latest(registry), prometheus_client.CONTENT_TYPE_LATEST, 200
+
+def reset_multiprocess_dir():
+    """Removes samples left over from a previous run (call once, before workers start)."""
+    if not MULTIPROC_DIR:
+        return
+    os.makedirs(MULTIPROC_DIR, exist_ok=True)
+    stale = glob.glob(os.path.join(MULTIPROC_DIR, '*.db'))
+    for path in stale:
+        os.remove(path)
+    if stale:
+        logging.info(f"Cleared {len(stale)} stale metric files from {MULTIPROC_DIR}")
+
+def mark_process_dead(pid):
+    """Drops the live-gauge files of an exited worker; counters and histograms are kept."""
+    if AVAILABLE and MULTIPROC_DIR:
+        multiprocess.mark_process_dead(pid)
@@ -0,0 +1,165 @@
+import io
+import os
+import time
+import logging
+from multiprocessing import shared_memory
+from concurrent.futures import CancelledError, wait
+from concurrent.futures.process import BrokenProcessPool
+
+from modules.process_pool import WatchedProcessPool
+
+# Page-level PDF text extraction. Pages are extracted in parallel on a process
+# pool (pypdf is pure Python, so threads would share one core) and handed back
+# in page order as they finish. Kept free of pandas so spawned workers start fast.
+PDF_WORKERS = int(os.getenv("PDF_WORKERS", min(4, os.cpu_count() or 1)))
+PDF_MAX_PAGES = int(os.getenv("PDF_MAX_PAGES", 300))  # later pages are ignored
+PDF_PAGE_TIMEOUT = float(os.getenv("PDF_PAGE_TIMEOUT", 15))  # seconds for any one page, from when a worker starts it
+PDF_PARALLEL_MIN_PAGES = int(os.getenv("PDF_PARALLEL_MIN_PAGES", 4))  # smaller files are read in-process
+_MAX_RESUBMITS = 2  # a page whose call keeps dying with pools other pages broke is given up on
+_START_POLL_SECONDS = 0.5  # how often to look whether a queued page has started
+
+class PdfPasswordError(ValueError):
+    """The PDF is encrypted with a non-empty password."""
+
+def _open_reader(source):
+    from pypdf import PdfReader
+    reader = PdfReader(io.BytesIO(source) if isinstance(source, bytes) else source)
+    if reader.is_encrypted:
+        try:
+            reader.decrypt("")
+        except Exception as e:
+            raise PdfPasswordError("This PDF is password protected and cannot be read.") from e
+    return reader
+
+_worker_reader = None  # (document key, reader), reused by one worker across pages of the same document
+
+def _attach_shared(name, size):
+    """Copies an in-memory PDF out of the parent's shared memory segment."""
+    # Spawned workers share the parent's resource tracker, so attaching registers
+    # nothing new and the parent's unlink() is the only cleanup
+    segment = shared_memory.SharedMemory(name=name)
+    try:
+        return bytes(segment.buf[:size])
+    finally:
+        segment.close()
+
+def _extract_page(document, index):
+    """
+    Pool task: text of one page. document is a file path or, for a PDF held
+    in memory, (shared memory name, size). Each worker opens a document only once.
+    """
+    global _worker_reader
+    key = (document, os.path.getmtime(document)) if isinstance(document, str) else document
+    if _worker_reader is None or _worker_reader[0] != key:
+        _worker_reader = None
+        _worker_reader = (key, _open_reader(document if isinstance(document, str) else _attach_shared(*document)))
+    return _worker_reader[1].pages[index].extract_text() or ""
+
+_pool = WatchedProcessPool(PDF_WORKERS)
+
+def iter_pdf_pages(source, max_pages=PDF_MAX_PAGES, page_timeout=PDF_PAGE_TIMEOUT):
+    """
+    Yields (page_number, text) in page order, each as soon as it and every
+    earlier page are extracted. A page that fails yields '' (and is logged)
+    instead of stalling the rest; so does one that takes longer than
+    page_timeout, but only on the process pool. Files under
+    PDF_PARALLEL_MIN_PAGES, and every file when PDF_WORKERS is 1, are read
+    in-process, where a stuck page cannot be interrupted and page_timeout
+    does not apply (batch parse workers are bounded by BATCH_PARSE_TIMEOUT
+    per file instead). source is a path or the PDF's bytes.
+
+    Raises:
+        PdfPasswordError: the file needs a password
+    """
+    reader = _open_reader(source)
+    total = len(reader.pages)
+    count = min(total, max_pages) if max_pages else total
+    if count < total:
+        logging.warning(f"PDF has {total} pages; reading only the first {count}")
+
+    if PDF_WORKERS <= 1 or count < PDF_PARALLEL_MIN_PAGES:
+        # No per-page timeout here: pypdf runs on this thread and cannot be stopped mid-page
+        for index in range(count):
+            try:
+                text = reader.pages[index].extract_text() or ""
+            except Exception as e:
+                logging.warning(f"PDF page {index + 1} could not be extracted: {e}")
+                text = ""
+            yield index + 1, text
+        return
+
+    if not isinstance(source, bytes):
+        yield from _pool_pages(source, count, page_timeout)
+        return
+    # In-memory PDFs reach the workers through one shared memory segment, not a file
+    # or a copy pickled into every page task; each worker copies it out once
+    segment = shared_memory.SharedMemory(create=True, size=len(source))
+    try:
+        segment.buf[:len(source)] = source
+        yield from _pool_pages((segment.name, len(source)), count, page_timeout)
+    finally:
+        segment.close()
+        segment.unlink()
+
+def _pool_pages(document, count, page_timeout):
+    pages = [_pool.submit(_extract_page, document, index) for index in range(count)]
+    try:
+        for index in range(count):
+            yield index + 1, _await_page(document, pages, index, page_timeout)
+    finally:
+        for future, ticket in pages:
+            future.cancel()
+            _pool.forget(ticket)
+
+def _resubmit(document, pages, first):
+    """Puts every unfinished page from first on onto the current pool, all at once."""
+    for index in range(first, len(pages)):
+        future, ticket = pages[index]
+        if future.done() and not future.cancelled() and not isinstance(
+                future.exception(), BrokenProcessPool):
+            continue
+        future.cancel()
+        _pool.forget(ticket)
+        pages[index] = _pool.submit(_extract_page, document, index)
+
+def _await_page(document, pages, index, page_timeout):
+    """
+    Text of one page, timed from when a worker starts on it: time queued
+    behind other requests' pages never counts towards page_timeout.
+    """
+    resubmits = 0
+    while True:
+        future, ticket = pages[index]
+        started = _pool.started(ticket)
+        if started is None:
+            wait([future], timeout=_START_POLL_SECONDS)
+        else:
+            wait([future], timeout=max(0.0, started + page_timeout - time.monotonic()))
+        if not future.done():
+            if started is not None and time.monotonic() - started >= page_timeout:
+                logging.warning(f"PDF page {index + 1} took longer than {page_timeout}s; skipping it")
+                _pool.restart()
+                _resubmit(document, pages, index + 1)
+                return ""
+            continue
+        try:
+            return future.result()
+        except (BrokenProcessPool, CancelledError):
+            if _pool.crashed(ticket):
+                logging.warning(f"PDF page {index + 1} crashed its worker; skipping it")
+                _resubmit(document, pages, index + 1)
+                return ""
+            if resubmits >= _MAX_RESUBMITS:
+                logging.warning(f"PDF page {index + 1} was interrupted {resubmits + 1} times; skipping it")
+                _resubmit(document, pages, index + 1)
+                return ""
+            # The pool was restarted underneath us (possibly by another request)
+            resubmits += 1
+            _resubmit(document, pages, index)
+        except Exception as e:
+            logging.warning(f"PDF page {index + 1} could not be extracted: {e}")
+            return ""
+
+def get_pdf_stats():
+    return {'workers': PDF_WORKERS, 'max_pages': PDF_MAX_PAGES, 'page_timeout': PDF_PAGE_TIMEOUT,
+            'pool_restarts': _pool.restarts}
@@ -0,0 +1,110 @@
+import os
+import time
+import signal
+import itertools
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+# Process pool shared by concurrent requests (batch parsing, PDF pages). Each
+# worker reports when a call actually starts running, so callers can time a
+# call from its start rather than from submission: time spent queued behind
+# other requests' work never counts against a timeout.
+
+_started = None  # worker side: SimpleQueue of (ticket, pid, start time); put() is written before the call runs
+
+def _init_worker(started, initializer, initargs):
+    global _started
+    _started = started
+    if initializer is not None:
+        initializer(*initargs)
+
+def _run_reported(ticket, func, args, kwargs):
+    # time.monotonic is system-wide on Linux and macOS, so parent and workers share it
+    _started.put((ticket, os.getpid(), time.monotonic()))
+    return func(*args, **kwargs)
+
+class WatchedProcessPool:
+    """
+    Lazily started spawn process pool. A call that overruns its timeout may
+    have wedged its worker, so callers restart() the pool, which terminates
+    every worker; calls other requests had on it then fail with
+    BrokenProcessPool/CancelledError and are resubmitted by their callers.
+    A pool broken by a worker that died is rebuilt on the next submit.
+    """
+    def __init__(self, workers, initializer=None, initargs=()):
+        self.workers = workers
+        self._initializer = initializer
+        self._initargs = initargs
+        self._lock = threading.Lock()
+        self._executor = None
+        self._queue = None
+        self._processes = {}  # pid -> Process, for every worker the pool has started
+        self._live = set()  # tickets whose start the caller still wants to know
+        self._starts = {}  # ticket -> (pid, start time)
+        self._tickets = itertools.count()
+        self.restarts = 0
+
+    def submit(self, func, *args, **kwargs):
+        """Returns (future, ticket); the ticket identifies the call to started() and crashed()."""
+        with self._lock:
+            if self._executor is None or self._executor._broken:
+                # Starts reported by the old workers still decide crashed() for their calls
+                self._drain()
+                # spawn: forking a process that runs request threads can copy held locks
+                context = multiprocessing.get_context('spawn')
+                self._queue = context.SimpleQueue()
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers, mp_context=context, initializer=_init_worker,
+                    initargs=(self._queue, self._initializer, self._initargs))
+            ticket = next(self._tickets)
+            self._live.add(ticket)
+            future = self._executor.submit(_run_reported, ticket, func, args, kwargs)
+            self._processes.update(self._executor._processes or {})
+            return future, ticket
+
+    def started(self, ticket):
+        """When the call began running (time.monotonic), or None while it is still queued."""
+        with self._lock:
+            self._drain()
+            entry = self._starts.get(ticket)
+        return entry[1] if entry else None
+
+    def crashed(self, ticket):
+        """True if the worker running this call died on its own (crash, OOM kill) rather than by restart()."""
+        with self._lock:
+            self._drain()
+            entry = self._starts.get(ticket)
+            process = self._processes.get(entry[0]) if entry else None
+        if process is None:
+            return False
+        exitcode = process.exitcode
+        return exitcode is not None and exitcode != -signal.SIGTERM
+
+    def forget(self, ticket):
+        with self._lock:
+            self._live.discard(ticket)
+            self._starts.pop(ticket, None)
+
+    def restart(self):
+        with self._lock:
+            self._drain()
+            executor, self._executor = self._executor, None
+            self.restarts += 1
+        if executor is None:
+            return
+        processes = list((executor._processes or {}).values())
+        executor.shutdown(wait=False, cancel_futures=True)
+        for process in processes:
+            process.terminate()
+
+    def _drain(self):
+        while self._queue is not None and not self._queue.empty():
+            ticket, pid, started = self._queue.get()
+            if ticket in self._live:
+                self._starts[ticket] = (pid, started)
+        # Exited workers are only kept while a call they ran may still be asked about
+        running_on = {pid for pid, _ in self._starts.values()}
+        for pid in [pid for pid, process in self._processes.items()
+                    if pid not in running_on and process.exitcode is not None]:
+            del self._processes[pid]
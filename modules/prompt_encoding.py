@@ -0,0 +1,142 @@
+import os
+import re
+import logging
+import threading
+import pandas as pd
+
+from modules.rate_limiter import CHARS_PER_TOKEN, estimate_tokens
+
+# Compact DataFrame rendering for prompts. DataFrame.to_string() pads every
+# cell to its column width, which costs input tokens without adding meaning.
+PROMPT_FORMAT = os.getenv("PROMPT_FORMAT", "csv")  # csv | tsv | columns | text (legacy to_string)
+PROMPT_FLOAT_PRECISION = int(os.getenv("PROMPT_FLOAT_PRECISION", 2))
+
+# Columns that identify rather than describe a student. They are dropped when a
+# name column is present to tell students apart.
+_IDENTIFIER_PATTERN = re.compile(r"(^|_)(id|uid|uuid|roll(_?no)?|phone|mobile|email|zip|postcode)($|_)")
+_NAME_PATTERN = re.compile(r"name")
+
+_SEPARATORS = {'csv': ',', 'tsv': '\t'}
+
+class _EncodingStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.prompts = 0
+        self.baseline_tokens = 0
+        self.encoded_tokens = 0
+
+    def record(self, baseline, encoded):
+        with self._lock:
+            self.prompts += 1
+            self.baseline_tokens += baseline
+            self.encoded_tokens += encoded
+
+    def snapshot(self):
+        with self._lock:
+            saved = self.baseline_tokens - self.encoded_tokens
+            return {
+                'format': PROMPT_FORMAT,
+                'prompts': self.prompts,
+                'baseline_tokens': self.baseline_tokens,
+                'encoded_tokens': self.encoded_tokens,
+                'tokens_saved': saved,
+                'savings_ratio': round(saved / self.baseline_tokens, 4) if self.baseline_tokens else 0.0,
+            }
+
+_stats = _EncodingStats()
+
+def get_encoding_stats():
+    return _stats.snapshot()
+
+def drop_identifier_columns(df, require_name=True):
+    """
+    Removes ID/contact columns. With require_name, they are kept when there is
+    no name column, since they are then the only way to tell students apart.
+    """
+    if require_name and not any(_NAME_PATTERN.search(str(c).lower()) for c in df.columns):
+        return df
+    ids = [c for c in df.columns if _IDENTIFIER_PATTERN.search(str(c).lower())]
+    return df.drop(columns=ids) if ids else df
+
+def compact_for_prompt(df, precision=PROMPT_FLOAT_PRECISION, drop_constant=True, drop_identifiers=True):
+    """
+    Returns (frame, notes): a copy of df with constant and identifier columns
+    removed and floats rounded. notes lists constant values as "col=value"
+    so that information survives in a single line.
+    """
+    frame = drop_identifier_columns(df) if drop_identifiers else df
+    notes = []
+
+    if drop_constant and len(frame) > 1:
+        constant = [c for c in frame.columns if frame[c].nunique(dropna=False) <= 1]
+        # Keep at least one column so the table is never empty
+        if constant and len(constant) < len(frame.columns):
+            notes = [f"{c}={frame[c].iloc[0]}" for c in constant]
+            frame = frame.drop(columns=constant)
+
+    floats = frame.select_dtypes(include=['floating']).columns
+    if len(floats):
+        frame = frame.copy()
+        for col in floats:
+            values = frame[col].round(precision)
+            # 85.0 -> 85 saves two characters per cell
+            if values.dropna().eq(values.dropna().round()).all():
+                values = values.astype('Int64')
+            frame[col] = values
+    return frame, notes
+
+def encode_dataframe(df, fmt=None, precision=PROMPT_FLOAT_PRECISION, include_index=False,
+                     drop_constant=True, drop_identifiers=True):
+    """
+    Renders a DataFrame for an LLM prompt.
+
+    Args:
+        df (pd.DataFrame): Data to render
+        fmt (str): 'csv', 'tsv', 'columns' (one line per column) or 'text' (legacy to_string)
+        precision (int): Decimal places kept for float columns
+        include_index (bool): Keep the index (needed for describe() output)
+
+    Returns:
+        str: Encoded table; constant columns are summarised on a leading line
+    """
+    fmt = fmt or PROMPT_FORMAT
+    if fmt == 'text':
+        return df.to_string()
+
+    frame, notes = compact_for_prompt(df, precision, drop_constant, drop_identifiers)
+    if fmt == 'columns':
+        if include_index:
+            frame = frame.reset_index()
+        lines = [
+            f"{col}: " + "|".join("" if pd.isna(v) else str(v) for v in frame[col].tolist())
+            for col in frame.columns
+        ]
+        body = "\n".join(lines)
+    else:
+        body = frame.to_csv(sep=_SEPARATORS.get(fmt, ','), index=include_index, lineterminator="\n").rstrip("\n")
+
+    if notes:
+        return f"All rows: {', '.join(notes)}\n{body}"
+    return body
+
+def encode_for_prompt(df, label, **kwargs):
+    """encode_dataframe() plus a log line with the token savings against to_string()."""
+    encoded = encode_dataframe(df, **kwargs)
+    baseline = _estimate_to_string_tokens(df)
+    tokens = estimate_tokens(encoded)
+    _stats.record(baseline, tokens)
+    if baseline:
+        logging.info(
+            f"{label} prompt data: ~{tokens} tokens vs ~{baseline} with to_string() "
+            f"({100 * (baseline - tokens) / baseline:.0f}% saved)"
+        )
+    return encoded
+
+def _estimate_to_string_tokens(df, sample_rows=50):
+    """Extrapolates to_string() size from a sample so the baseline stays cheap on big frames."""
+    if df.empty:
+        return 0
+    sample = df.head(sample_rows).to_string()
+    rows = min(len(df), sample_rows)
+    header, _, body = sample.partition("\n")
+    return int((len(header) + len(body) * len(df) / rows) // CHARS_PER_TOKEN)
@@ -0,0 +1,199 @@
+import os
+import time
+import sqlite3
+import logging
+import threading
+from collections import deque
+
+# Client-side request (RPM) and token (TPM) budgets shared by every Gemini caller.
+# Set RATE_LIMIT_BACKEND=sqlite so all gunicorn workers draw from one budget.
+GEMINI_RPM = float(os.getenv("GEMINI_RPM", 60))  # 0 disables the request budget
+GEMINI_TPM = float(os.getenv("GEMINI_TPM", 1000000))  # 0 disables the token budget
+RATE_LIMIT_BACKEND = os.getenv("RATE_LIMIT_BACKEND", "memory")
+RATE_LIMIT_DB = os.getenv("RATE_LIMIT_DB", os.path.join('outputs', 'cache', 'rate_limit.db'))
+RATE_LIMIT_MAX_WAIT = float(os.getenv("RATE_LIMIT_MAX_WAIT", 120))  # seconds a caller may queue
+CHARS_PER_TOKEN = 4  # rough estimate for English/tabular text
+
+class RateLimitTimeout(Exception):
+    """The caller waited longer than its timeout for budget."""
+    pass
+
+def estimate_tokens(text):
+    return max(1, len(text) // CHARS_PER_TOKEN)
+
+class _MemoryBuckets:
+    """Token buckets held in this process. Each refills at capacity/60 per second."""
+    def __init__(self, capacities):
+        now = time.monotonic()
+        self.capacities = capacities
+        self._levels = {name: (capacity, now) for name, capacity in capacities.items()}
+        self._lock = threading.Lock()
+
+    def try_take(self, amounts):
+        """Takes amounts from every bucket, or none. Returns 0, or seconds until it could succeed."""
+        with self._lock:
+            now = time.monotonic()
+            levels = {}
+            for name, amount in amounts.items():
+                level, updated = self._levels[name]
+                capacity = self.capacities[name]
+                levels[name] = min(capacity, level + (now - updated) * capacity / 60.0)
+
+            wait = _wait_needed(levels, amounts, self.capacities)
+            if wait == 0:
+                for name, amount in amounts.items():
+                    levels[name] -= amount
+            for name, level in levels.items():
+                self._levels[name] = (level, now)
+            return wait
+
+class _SQLiteBuckets:
+    """Same buckets, stored in SQLite so separate worker processes share them."""
+    def __init__(self, capacities, db_path=RATE_LIMIT_DB):
+        self.capacities = capacities
+        self.db_path = db_path
+        os.makedirs(os.path.dirname(db_path) or '.', exist_ok=True)
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS buckets (name TEXT PRIMARY KEY, level REAL NOT NULL, updated REAL NOT NULL)"
+            )
+
+    def _connect(self):
+        return sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+
+    def try_take(self, amounts):
+        conn = self._connect()
+        try:
+            # IMMEDIATE takes the write lock up front so read-refill-update is atomic across processes
+            conn.execute("BEGIN IMMEDIATE")
+            now = time.time()
+            stored = dict((name, (level, updated)) for name, level, updated in
+                          conn.execute("SELECT name, level, updated FROM buckets").fetchall())
+            levels = {}
+            for name in amounts:
+                capacity = self.capacities[name]
+                level, updated = stored.get(name, (capacity, now))
+                levels[name] = min(capacity, level + max(0.0, now - updated) * capacity / 60.0)
+
+            wait = _wait_needed(levels, amounts, self.capacities)
+            if wait == 0:
+                for name, amount in amounts.items():
+                    levels[name] -= amount
+            conn.executemany(
+                "INSERT OR REPLACE INTO buckets (name, level, updated) VALUES (?, ?, ?)",
+                [(name, level, now) for name, level in levels.items()],
+            )
+            conn.execute("COMMIT")
+            return wait
+        except sqlite3.Error:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+def _wait_needed(levels, amounts, capacities):
+    wait = 0.0
+    for name, amount in amounts.items():
+        if levels[name] < amount:
+            wait = max(wait, (amount - levels[name]) * 60.0 / capacities[name])
+    return wait
+
+class RateLimiter:
+    """
+    Blocks callers until both the request and token budgets allow their call.
+    Waiters are served first-come first-served, so a large prompt cannot be
+    starved by a stream of small ones.
+    """
+    def __init__(self, rpm=GEMINI_RPM, tpm=GEMINI_TPM, backend=RATE_LIMIT_BACKEND):
+        self.capacities = {}
+        if rpm > 0:
+            self.capacities['requests'] = rpm
+        if tpm > 0:
+            self.capacities['tokens'] = tpm
+        self.backend_name = backend
+
+        if not self.capacities:
+            self._buckets = None
+        elif backend == 'sqlite':
+            self._buckets = _SQLiteBuckets(self.capacities)
+        else:
+            self._buckets = _MemoryBuckets(self.capacities)
+
+        self._cond = threading.Condition()
+        self._queue = deque()
+        self.acquired = 0
+        self.delayed = 0
+        self.timeouts = 0
+        self.wait_seconds = 0.0
+
+    def acquire(self, tokens=1, timeout=RATE_LIMIT_MAX_WAIT):
+        """Waits for one request slot and `tokens` tokens; raises RateLimitTimeout after timeout seconds."""
+        if self._buckets is None:
+            return
+        amounts = {}
+        if 'requests' in self.capacities:
+            amounts['requests'] = 1
+        if 'tokens' in self.capacities:
+            # A prompt larger than the whole budget can still go once the bucket is full
+            amounts['tokens'] = min(tokens, self.capacities['tokens'])
+
+        started = time.monotonic()
+        deadline = started + timeout
+        ticket = object()
+        with self._cond:
+            self._queue.append(ticket)
+            while self._queue[0] is not ticket:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._queue.remove(ticket)
+                    self._cond.notify_all()
+                    self._timed_out()
+                    raise RateLimitTimeout(f"Waited {timeout:.0f}s for Gemini rate-limit budget")
+                self._cond.wait(remaining)
+
+        # At the head of the queue: sleep until the buckets can cover this call
+        try:
+            while True:
+                wait = self._buckets.try_take(amounts)
+                if wait == 0:
+                    break
+                if time.monotonic() + wait > deadline:
+                    self._timed_out()
+                    raise RateLimitTimeout(f"Gemini rate-limit budget would take {wait:.0f}s to refill")
+                time.sleep(wait)
+        finally:
+            with self._cond:
+                self._queue.popleft()
+                self._cond.notify_all()
+
+        waited = time.monotonic() - started
+        with self._cond:
+            self.acquired += 1
+            if waited > 0.001:
+                self.delayed += 1
+                self.wait_seconds += waited
+        if waited > 1:
+            logging.info(f"Rate limiter delayed a Gemini call by {waited:.1f}s")
+
+    def _timed_out(self):
+        with self._cond:
+            self.timeouts += 1
+
+    def stats(self):
+        with self._cond:
+            return {
+                'backend': self.backend_name if self._buckets else 'disabled',
+                'rpm': self.capacities.get('requests', 0),
+                'tpm': self.capacities.get('tokens', 0),
+                'acquired': self.acquired,
+                'delayed': self.delayed,
+                'timeouts': self.timeouts,
+                'wait_seconds': round(self.wait_seconds, 3),
+                'queued': len(self._queue),
+            }
+
+gemini_limiter = RateLimiter()
+
+def get_rate_limit_stats():
+    return gemini_limiter.stats()
@@ -1,7 +1,13 @@
 import os
+import json
+import itertools
 from datetime import datetime
+from modules.tracing import traced
 
-def save_analysis_report(file_name, analysis_results):
+REPORT_FORMATS = ('txt', 'md', 'json')
+
+@traced()
+def save_analysis_report(file_name, analysis_results, output_format='txt'):
     """
     Save analysis results to a formatted report file.
 
@@ -9,56 +15,90 @@ def save_analysis_report(file_name, analysis_results):
         file_name (str): Original data filename
         analysis_results (dict): Dictionary containing analysis results
                                 Keys: 'standard', 'comparative'
+        output_format (str): 'txt' (plain text), 'md' (Markdown) or 'json'
 
     Returns:
         str: Path to the saved report file
     """
     # Create timestamp for unique filename
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    generated = datetime.now()
+    timestamp = generated.strftime("%Y%m%d_%H%M%S")
     base_name = os.path.splitext(file_name)[0]
-    report_filename = f"report_{base_name}_{timestamp}.txt"
-    report_path = os.path.join('outputs', 'reports', report_filename)
+    render = {'txt': _render_text, 'md': _render_markdown, 'json': _render_json}[output_format]
 
     try:
-        with open(report_path, 'w', encoding='utf-8') as report_file:
-            # Write header
-            report_file.write("="*70 + "\n")
-            report_file.write("        STUDENT PERFORMANCE ANALYSIS REPORT\n")
-            report_file.write("    Generated by Student Performance Analyzer with GenAI\n")
-            report_file.write("="*70 + "\n\n")
-
-            # Write metadata
-            report_file.write(f"Report Generated: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
-            report_file.write(f"Data Source: {file_name}\n")
-            report_file.write(f"Analysis Types: {', '.join(analysis_results.keys()).title()}\n")
-            report_file.write("\n" + "="*70 + "\n\n")
-
-            # Write standard analysis if present
-            if 'standard' in analysis_results:
-                report_file.write("SECTION 1: INDIVIDUAL STUDENT ANALYSIS\n")
-                report_file.write("-"*70 + "\n\n")
-                report_file.write(analysis_results['standard'])
-                report_file.write("\n\n" + "="*70 + "\n\n")
-
-            # Write comparative analysis if present
-            if 'comparative' in analysis_results:
-                report_file.write("SECTION 2: COMPARATIVE CLASS ANALYSIS\n")
-                report_file.write("-"*70 + "\n\n")
-                report_file.write(analysis_results['comparative'])
-                report_file.write("\n\n" + "="*70 + "\n\n")
-
-            # Write footer
-            report_file.write("END OF REPORT\n")
-            report_file.write("="*70 + "\n")
-            report_file.write("\nThis report contains AI-generated insights.\n")
-            report_file.write("Please review and validate before making educational decisions.\n")
-
-        return report_path
+        content = render(file_name, analysis_results, generated)
+        # Exclusive create, so reports for same-named files saved in the same second never overwrite each other
+        for attempt in itertools.count(1):
+            suffix = f"_{attempt}" if attempt > 1 else ""
+            report_path = os.path.join('outputs', 'reports', f"report_{base_name}_{timestamp}{suffix}.{output_format}")
+            try:
+                with open(report_path, 'x', encoding='utf-8') as report_file:
+                    report_file.write(content)
+                return report_path
+            except FileExistsError:
+                continue
 
     except Exception as e:
         print(f"❌ Error saving report: {e}")
         return None
 
+def _render_text(file_name, analysis_results, generated):
+    # Write header
+    lines = ["="*70 + "\n"]
+    lines.append("        STUDENT PERFORMANCE ANALYSIS REPORT\n")
+    lines.append("    Generated by Student Performance Analyzer with GenAI\n")
+    lines.append("="*70 + "\n\n")
+
+    # Write metadata
+    lines.append(f"Report Generated: {generated.strftime('%Y-%m-%d %H:%M:%S')}\n")
+    lines.append(f"Data Source: {file_name}\n")
+    lines.append(f"Analysis Types: {', '.join(analysis_results.keys()).title()}\n")
+    lines.append("\n" + "="*70 + "\n\n")
+
+    # Write standard analysis if present
+    if 'standard' in analysis_results:
+        lines.append("SECTION 1: INDIVIDUAL STUDENT ANALYSIS\n")
+        lines.append("-"*70 + "\n\n")
+        lines.append(analysis_results['standard'])
+        lines.append("\n\n" + "="*70 + "\n\n")
+
+    # Write comparative analysis if present
+    if 'comparative' in analysis_results:
+        lines.append("SECTION 2: COMPARATIVE CLASS ANALYSIS\n")
+        lines.append("-"*70 + "\n\n")
+        lines.append(analysis_results['comparative'])
+        lines.append("\n\n" + "="*70 + "\n\n")
+
+    # Write footer
+    lines.append("END OF REPORT\n")
+    lines.append("="*70 + "\n")
+    lines.append("\nThis report contains AI-generated insights.\n")
+    lines.append("Please review and validate before making educational decisions.\n")
+    return "".join(lines)
+
+def _render_markdown(file_name, analysis_results, generated):
+    sections = [
+        "# Student Performance Analysis Report",
+        f"- **Report Generated**: {generated.strftime('%Y-%m-%d %H:%M:%S')}\n"
+        f"- **Data Source**: {file_name}\n"
+        f"- **Analysis Types**: {', '.join(analysis_results.keys()).title()}",
+    ]
+    if 'standard' in analysis_results:
+        sections.append("## Individual Student Analysis\n\n" + analysis_results['standard'].strip())
+    if 'comparative' in analysis_results:
+        sections.append("## Comparative Class Analysis\n\n" + analysis_results['comparative'].strip())
+    sections.append("---\n\n*This report contains AI-generated insights. "
+                    "Please review and validate before making educational decisions.*")
+    return "\n\n".join(sections) + "\n"
+
+def _render_json(file_name, analysis_results, generated):
+    return json.dumps({
+        'generated': generated.isoformat(timespec='seconds'),
+        'data_source': file_name,
+        'results': analysis_results,
+    }, indent=2, ensure_ascii=False) + "\n"
+
 def generate_summary_statistics(student_data):
     """
     Generate basic statistical summary from DataFrame.
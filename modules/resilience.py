@@ -0,0 +1,261 @@
+import os
+import re
+import time
+import random
+import logging
+import threading
+from collections import Counter
+
+from modules.metrics import observe_gemini_attempt, count_gemini_retry, count_gemini_failure
+
+# Retry/backoff and circuit breaking for upstream (Gemini) calls.
+RETRY_MAX_DELAY = float(os.getenv("RETRY_MAX_DELAY", 30))  # seconds, cap for one backoff sleep
+RETRY_MAX_HINT_DELAY = float(os.getenv("RETRY_MAX_HINT_DELAY", 300))  # seconds, cap for a server's retry-after hint
+BREAKER_FAILURE_THRESHOLD = int(os.getenv("BREAKER_FAILURE_THRESHOLD", 5))
+BREAKER_RECOVERY_TIMEOUT = float(os.getenv("BREAKER_RECOVERY_TIMEOUT", 30))  # seconds open before a trial call
+
+# Error classes
+QUOTA = 'quota'
+SERVER = 'server'
+TIMEOUT = 'timeout'
+NETWORK = 'network'
+INVALID = 'invalid'
+AUTH = 'auth'
+RATE_LIMITED = 'rate_limited'  # our own client-side limiter gave up waiting
+UNKNOWN = 'unknown'
+
+RETRYABLE = {QUOTA, SERVER, TIMEOUT, NETWORK, UNKNOWN}
+# Classes that say something about upstream health and therefore count towards the breaker
+UPSTREAM_FAILURES = {QUOTA, SERVER, TIMEOUT, NETWORK}
+
+_RETRY_HINT_PATTERNS = [
+    re.compile(r"retry[_ ]delay\s*\{\s*seconds:\s*(\d+)", re.IGNORECASE),
+    re.compile(r"retry (?:in|after) (\d+(?:\.\d+)?)\s*s", re.IGNORECASE),
+]
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling upstream while the breaker is open."""
+    def __init__(self, name, retry_in):
+        self.retry_in = retry_in
+        super().__init__(f"{name} is temporarily unavailable; retry in {retry_in:.0f}s")
+
+def classify_error(exc):
+    """Maps an exception from the Gemini SDK (google.api_core) or the network stack to an error class."""
+    code = getattr(exc, 'code', None)
+    code = code if isinstance(code, int) else None
+    name = type(exc).__name__
+
+    if isinstance(exc, CircuitOpenError):
+        return SERVER
+    if name == 'RateLimitTimeout':
+        return RATE_LIMITED
+    if code == 429 or name in ('ResourceExhausted', 'TooManyRequests'):
+        return QUOTA
+    if code in (401, 403) or name in ('Unauthenticated', 'PermissionDenied'):
+        return AUTH
+    if code in (400, 404, 422) or name in ('InvalidArgument', 'NotFound', 'BlockedPromptException',
+                                           'StopCandidateException', 'ValueError', 'TypeError'):
+        return INVALID
+    if code == 504 or name in ('DeadlineExceeded', 'Timeout', 'TimeoutError', 'ReadTimeout'):
+        return TIMEOUT
+    if (code is not None and code >= 500) or name in ('ServiceUnavailable', 'InternalServerError',
+                                                       'BadGateway', 'GatewayTimeout'):
+        return SERVER
+    if isinstance(exc, (ConnectionError, OSError)):
+        return NETWORK
+    return UNKNOWN
+
+def retry_after_seconds(exc):
+    """Server-provided retry hint (Retry-After header or RetryInfo detail), if any."""
+    response = getattr(exc, 'response', None)
+    headers = getattr(response, 'headers', None)
+    if headers:
+        value = headers.get('Retry-After')
+        if value:
+            try:
+                return max(0.0, float(value))
+            except ValueError:
+                pass
+
+    for detail in getattr(exc, 'details', None) or []:
+        delay = getattr(detail, 'retry_delay', None)
+        if delay is not None:
+            return getattr(delay, 'seconds', 0) + getattr(delay, 'nanos', 0) / 1e9
+
+    message = str(exc)
+    for pattern in _RETRY_HINT_PATTERNS:
+        match = pattern.search(message)
+        if match:
+            return float(match.group(1))
+    return None
+
+def backoff_delay(attempt, base_delay, max_delay=RETRY_MAX_DELAY, hint=None, max_hint=RETRY_MAX_HINT_DELAY):
+    """
+    Exponential backoff with full jitter; a server hint sets the minimum wait,
+    honoured up to max_hint even when that is longer than max_delay.
+    """
+    delay = random.uniform(0, min(max_delay, base_delay * (2 ** attempt)))
+    if hint is not None:
+        delay = max(delay, min(hint, max_hint))
+    return delay
+
+class CircuitBreaker:
+    """
+    Process-wide breaker: after failure_threshold consecutive upstream failures it
+    opens and fails fast for recovery_timeout seconds, then lets a single trial
+    call through (half-open) to decide whether to close again.
+    """
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, name, failure_threshold=BREAKER_FAILURE_THRESHOLD,
+                 recovery_timeout=BREAKER_RECOVERY_TIMEOUT):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self._lock = threading.Lock()
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trial_in_flight = False
+        self.opens = 0
+        self.rejections = 0
+
+    def before_call(self):
+        """Raises CircuitOpenError if the call must not reach upstream."""
+        with self._lock:
+            if self._state == self.OPEN:
+                waited = time.monotonic() - self._opened_at
+                if waited < self.recovery_timeout:
+                    self.rejections += 1
+                    raise CircuitOpenError(self.name, self.recovery_timeout - waited)
+                self._state = self.HALF_OPEN
+                self._trial_in_flight = False
+            if self._state == self.HALF_OPEN:
+                if self._trial_in_flight:
+                    self.rejections += 1
+                    raise CircuitOpenError(self.name, self.recovery_timeout)
+                self._trial_in_flight = True
+
+    def record_success(self):
+        with self._lock:
+            if self._state != self.CLOSED:
+                logging.info(f"Circuit '{self.name}' closed")
+            self._state = self.CLOSED
+            self._failures = 0
+            self._trial_in_flight = False
+
+    def release(self):
+        """Ends a call that never reached upstream, counting it neither way."""
+        with self._lock:
+            self._trial_in_flight = False
+
+    def record_failure(self, error_class):
+        if error_class == RATE_LIMITED:
+            # Our own limiter gave up before upstream was called
+            self.release()
+            return
+        with self._lock:
+            if error_class not in UPSTREAM_FAILURES:
+                # The upstream answered; a bad prompt says nothing about its health
+                self._trial_in_flight = False
+                if self._state == self.HALF_OPEN:
+                    self._state = self.CLOSED
+                    self._failures = 0
+                return
+            self._failures += 1
+            if self._state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                if self._state != self.OPEN:
+                    logging.warning(f"Circuit '{self.name}' opened after {self._failures} failures")
+                    self.opens += 1
+                self._state = self.OPEN
+                self._opened_at = time.monotonic()
+                self._trial_in_flight = False
+
+    def stats(self):
+        with self._lock:
+            return {
+                'state': self._state,
+                'consecutive_failures': self._failures,
+                'opens': self.opens,
+                'rejections': self.rejections,
+            }
+
+class RetryStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.attempts = 0
+        self.retries = Counter()
+        self.failures = Counter()
+        self.sleep_seconds = 0.0
+
+    def record(self, **changes):
+        with self._lock:
+            self.calls += changes.get('calls', 0)
+            self.attempts += changes.get('attempts', 0)
+            self.sleep_seconds += changes.get('sleep', 0.0)
+            if 'retry' in changes:
+                self.retries[changes['retry']] += 1
+            if 'failure' in changes:
+                self.failures[changes['failure']] += 1
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'calls': self.calls,
+                'attempts': self.attempts,
+                'retries': dict(self.retries),
+                'failures': dict(self.failures),
+                'sleep_seconds': round(self.sleep_seconds, 3),
+            }
+
+gemini_breaker = CircuitBreaker('gemini')
+retry_stats = RetryStats()
+
+def call_with_retry(func, max_attempts, base_delay, breaker=gemini_breaker, stats=retry_stats, acquire=None):
+    """
+    Calls func() with error classification, jittered exponential backoff and
+    circuit breaking. Non-retryable errors (invalid prompt, auth) are raised
+    immediately; so is CircuitOpenError while the breaker is open.
+    acquire() runs before each attempt (e.g. to wait for rate-limit budget),
+    ahead of the breaker, so a half-open trial slot is never held while
+    waiting; its wait is not timed as part of the attempt, and if it gives up
+    the call fails without touching the breaker.
+    """
+    stats.record(calls=1)
+    for attempt in range(max_attempts):
+        if acquire is not None:
+            try:
+                acquire()
+            except Exception as e:
+                error_class = classify_error(e)
+                stats.record(failure=error_class)
+                count_gemini_failure(error_class)
+                raise
+        breaker.before_call()
+        stats.record(attempts=1)
+        started = time.perf_counter()
+        try:
+            result = func()
+        except Exception as e:
+            error_class = classify_error(e)
+            observe_gemini_attempt(time.perf_counter() - started, error_class)
+            breaker.record_failure(error_class)
+            if error_class not in RETRYABLE or attempt == max_attempts - 1:
+                stats.record(failure=error_class)
+                count_gemini_failure(error_class)
+                raise
+            delay = backoff_delay(attempt, base_delay, hint=retry_after_seconds(e))
+            logging.warning(f"Gemini call failed ({error_class}: {e}); retrying in {delay:.1f}s")
+            stats.record(retry=error_class, sleep=delay)
+            count_gemini_retry(error_class)
+            time.sleep(delay)
+        else:
+            observe_gemini_attempt(time.perf_counter() - started)
+            breaker.record_success()
+            return result
+
+def get_resilience_stats():
+    return {'breaker': gemini_breaker.stats(), 'retries': retry_stats.snapshot()}
@@ -0,0 +1,176 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+
+# Two-tier cache for LLM responses: an in-memory LRU in front of a SQLite file.
+# Entries are keyed by a hash of (model name, prompt text, generation params).
+CACHE_ENABLED = os.getenv("RESPONSE_CACHE_ENABLED", "1") != "0"
+CACHE_DIR = os.getenv("RESPONSE_CACHE_DIR", os.path.join('outputs', 'cache'))
+CACHE_TTL = int(os.getenv("RESPONSE_CACHE_TTL", 24 * 60 * 60))  # seconds
+CACHE_MAX_BYTES = int(os.getenv("RESPONSE_CACHE_MAX_BYTES", 64 * 1024 * 1024))
+CACHE_MEMORY_ITEMS = int(os.getenv("RESPONSE_CACHE_MEMORY_ITEMS", 256))
+
+def make_cache_key(model_name, prompt, params=None):
+    """Content address for a generation request."""
+    payload = json.dumps(
+        {'model': model_name, 'prompt': prompt, 'params': params or {}},
+        sort_keys=True, default=str,
+    )
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+class ResponseCache:
+    def __init__(self, directory=CACHE_DIR, ttl=CACHE_TTL, max_bytes=CACHE_MAX_BYTES,
+                 memory_items=CACHE_MEMORY_ITEMS):
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.memory_items = memory_items
+        self.db_path = os.path.join(directory, 'responses.db')
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                " key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL,"
+                " created REAL NOT NULL, accessed REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_accessed ON responses (accessed)")
+
+    def _connect(self):
+        return sqlite3.connect(self.db_path, timeout=10)
+
+    def get(self, key):
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                value, created = entry
+                if now - created < self.ttl:
+                    self._memory.move_to_end(key)
+                    self.memory_hits += 1
+                    return value
+                del self._memory[key]
+
+        try:
+            with self._connect() as conn:
+                row = conn.execute(
+                    "SELECT value, created FROM responses WHERE key = ?", (key,)
+                ).fetchone()
+                if row is not None and now - row[1] >= self.ttl:
+                    conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                    row = None
+                if row is not None:
+                    conn.execute("UPDATE responses SET accessed = ? WHERE key = ?", (now, key))
+        except sqlite3.Error as e:
+            logging.warning(f"Response cache read failed: {e}")
+            row = None
+
+        with self._lock:
+            if row is None:
+                self.misses += 1
+                return None
+            self.disk_hits += 1
+            self._remember(key, row[0], row[1])
+            return row[0]
+
+    def put(self, key, value):
+        now = time.time()
+        with self._lock:
+            self._remember(key, value, now)
+
+        size = len(value.encode('utf-8'))
+        try:
+            with self._connect() as conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO responses (key, value, size, created, accessed)"
+                    " VALUES (?, ?, ?, ?, ?)",
+                    (key, value, size, now, now),
+                )
+                self._evict(conn, now)
+        except sqlite3.Error as e:
+            logging.warning(f"Response cache write failed: {e}")
+
+    def _remember(self, key, value, created):
+        self._memory[key] = (value, created)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_items:
+            self._memory.popitem(last=False)
+
+    def _evict(self, conn, now):
+        expired = conn.execute(
+            "DELETE FROM responses WHERE created <= ?", (now - self.ttl,)
+        ).rowcount
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        evicted = expired
+        if total > self.max_bytes:
+            # Drop least recently used rows until we are back under budget
+            for key, size in conn.execute(
+                "SELECT key, size FROM responses ORDER BY accessed ASC"
+            ).fetchall():
+                if total <= self.max_bytes:
+                    break
+                conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                total -= size
+                evicted += 1
+        if evicted:
+            with self._lock:
+                self.evictions += evicted
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+        with self._connect() as conn:
+            conn.execute("DELETE FROM responses")
+
+    def stats(self):
+        try:
+            with self._connect() as conn:
+                entries, disk_bytes = conn.execute(
+                    "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses"
+                ).fetchone()
+        except sqlite3.Error:
+            entries, disk_bytes = 0, 0
+
+        with self._lock:
+            hits = self.memory_hits + self.disk_hits
+            lookups = hits + self.misses
+            return {
+                'memory_hits': self.memory_hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_ratio': round(hits / lookups, 4) if lookups else 0.0,
+                'memory_entries': len(self._memory),
+                'memory_bytes': sum(len(v.encode('utf-8')) for v, _ in self._memory.values()),
+                'disk_entries': entries,
+                'bytes_stored': disk_bytes,
+            }
+
+_cache = None
+_cache_lock = threading.Lock()
+
+def get_response_cache():
+    """Returns the process-wide cache, or None when caching is disabled or unavailable."""
+    global _cache
+    if not CACHE_ENABLED:
+        return None
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                try:
+                    _cache = ResponseCache()
+                except (OSError, sqlite3.Error) as e:
+                    logging.error(f"Response cache unavailable: {e}")
+                    return None
+    return _cache
@@ -0,0 +1,141 @@
+import os
+import json
+import time
+import logging
+import functools
+import threading
+import contextvars
+from contextlib import contextmanager
+
+# Lightweight per-request timing spans. A trace is bound to the current
+# context (request thread); spans recorded while it is active are summed by
+# name for the Server-Timing header and a structured log line.
+# With TRACING_ENABLED=0 the decorator returns the function untouched and
+# span() hands back a shared no-op context manager.
+TRACING_ENABLED = os.getenv("TRACING_ENABLED", "1") != "0"
+
+_current = contextvars.ContextVar('trace', default=None)
+_trace_log = logging.getLogger('trace')
+
+class Trace:
+    def __init__(self, name):
+        self.name = name
+        self.started = time.perf_counter()
+        self.duration = None
+        self._lock = threading.Lock()
+        self._totals = {}  # span name -> [seconds, calls], in first-seen order
+
+    def add(self, name, seconds):
+        with self._lock:
+            entry = self._totals.get(name)
+            if entry is None:
+                self._totals[name] = [seconds, 1]
+            else:
+                entry[0] += seconds
+                entry[1] += 1
+
+    def finish(self):
+        self.duration = time.perf_counter() - self.started
+        return self
+
+    def spans(self):
+        """span name -> {'ms': total milliseconds, 'calls': n}"""
+        with self._lock:
+            return {name: {'ms': round(seconds * 1000, 2), 'calls': calls}
+                    for name, (seconds, calls) in self._totals.items()}
+
+    def server_timing(self):
+        parts = []
+        for name, span in self.spans().items():
+            entry = f"{name};dur={span['ms']}"
+            if span['calls'] > 1:
+                entry += f';desc="{span["calls"]} calls"'
+            parts.append(entry)
+        if self.duration is not None:
+            parts.append(f"total;dur={round(self.duration * 1000, 2)}")
+        return ", ".join(parts)
+
+    def log(self, **fields):
+        record = {'trace': self.name, **fields, 'spans': self.spans()}
+        if self.duration is not None:
+            record['total_ms'] = round(self.duration * 1000, 2)
+        _trace_log.info(json.dumps(record))
+
+class _NullSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+_NULL_SPAN = _NullSpan()
+
+class _Span:
+    __slots__ = ('name', 'trace', 'start')
+
+    def __init__(self, name, trace):
+        self.name = name
+        self.trace = trace
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.trace.add(self.name, time.perf_counter() - self.start)
+        return False
+
+def span(name):
+    """Context manager timing a block as `name` in the active trace (no-op without one)."""
+    if not TRACING_ENABLED:
+        return _NULL_SPAN
+    trace = _current.get()
+    if trace is None:
+        return _NULL_SPAN
+    return _Span(name, trace)
+
+def traced(name=None):
+    """Decorator form of span(); defaults to the function name without leading underscores."""
+    def decorate(func):
+        if not TRACING_ENABLED:
+            return func
+        span_name = name or func.__name__.lstrip('_')
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            trace = _current.get()
+            if trace is None:
+                return func(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                trace.add(span_name, time.perf_counter() - start)
+        return wrapper
+    return decorate
+
+def start_trace(name):
+    """Begins a trace in the current context. Returns a token for end_trace(), or None if disabled."""
+    if not TRACING_ENABLED:
+        return None
+    return _current.set(Trace(name))
+
+def end_trace(token):
+    """Ends the trace started with token and returns it (finished)."""
+    trace = _current.get()
+    _current.reset(token)
+    return trace.finish()
+
+@contextmanager
+def trace(name, **log_fields):
+    """Traces a block and logs the result, e.g. one CLI run."""
+    token = start_trace(name)
+    try:
+        yield _current.get()
+    finally:
+        if token is not None:
+            end_trace(token).log(**log_fields)
+
+def submit_in_context(pool, func, *args):
+    """pool.submit() that carries the caller's trace into the worker thread."""
+    return pool.submit(contextvars.copy_context().run, func, *args)
@@ -0,0 +1,314 @@
+import io
+import os
+import time
+import uuid
+import fcntl
+import sqlite3
+import logging
+import threading
+
+from modules.data_extractor import read_data, read_stream
+
+# Chunked, resumable uploads for files past MAX_CONTENT_LENGTH. Each part is
+# appended to a spool file on disk, so a request never holds more than one
+# copy block in memory, and session state lives in SQLite so parts may land
+# on any gunicorn worker. CSV and TXT uploads can be parsed while later parts
+# are still arriving (see open_stream).
+UPLOADS_DIR = os.getenv("UPLOADS_DIR", os.path.join('outputs', 'uploads'))
+UPLOAD_MAX_BYTES = int(os.getenv("UPLOAD_MAX_BYTES", 2 * 1024 ** 3))
+UPLOAD_SESSION_TTL = float(os.getenv("UPLOAD_SESSION_TTL", 24 * 3600))  # unfinished sessions are discarded after this
+# A parse job waiting on the next part gives up (and frees its job slot) after
+# this long; the part that arrives after that starts a new job.
+UPLOAD_IDLE_TIMEOUT = float(os.getenv("UPLOAD_IDLE_TIMEOUT", 30))
+UPLOAD_POLL_SECONDS = float(os.getenv("UPLOAD_POLL_SECONDS", 0.2))
+STREAMABLE_EXTENSIONS = ('.csv', '.txt')
+SUPPORTED_EXTENSIONS = ('.csv', '.txt', '.xlsx', '.xls', '.pdf')
+
+STATUS_OPEN = 'open'
+STATUS_COMPLETE = 'complete'
+STATUS_ABORTED = 'aborted'
+
+_COPY_BLOCK = 1024 * 1024
+
+class UploadError(ValueError):
+    """The upload cannot take this part or request in its current state."""
+
+class UploadIdle(UploadError):
+    """No new part arrived for UPLOAD_IDLE_TIMEOUT while a reader was waiting."""
+
+class OffsetMismatch(UploadError):
+    """A part was sent for the wrong offset; the client should resume from self.offset."""
+    def __init__(self, offset):
+        super().__init__(f"Expected a part at offset {offset}")
+        self.offset = offset
+
+class UploadStore:
+    def __init__(self, directory=UPLOADS_DIR):
+        self.directory = directory
+        self.db_path = os.path.join(directory, 'uploads.db')
+        os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS uploads ("
+                " id TEXT PRIMARY KEY, filename TEXT NOT NULL, analysis_type INTEGER NOT NULL,"
+                " total_bytes INTEGER, status TEXT NOT NULL, job_id TEXT,"
+                " created REAL NOT NULL, updated REAL NOT NULL)"
+            )
+
+    def _connect(self):
+        return sqlite3.connect(self.db_path, timeout=30)
+
+    # --- Public API ---
+
+    def create(self, filename, analysis_type, total_bytes=None):
+        """Opens an upload session and returns it."""
+        _, extension = os.path.splitext(filename)
+        if extension.lower() not in SUPPORTED_EXTENSIONS:
+            raise UploadError('Valid formats: CSV, Excel, PDF, Text.')
+        if total_bytes is not None and total_bytes > UPLOAD_MAX_BYTES:
+            raise UploadError(f"Uploads are limited to {UPLOAD_MAX_BYTES} bytes")
+        self._expire()
+
+        upload_id = uuid.uuid4().hex
+        open(self.spool_path(upload_id, filename), 'wb').close()
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO uploads (id, filename, analysis_type, total_bytes, status, created, updated)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (upload_id, filename, analysis_type, total_bytes, STATUS_OPEN, now, now),
+            )
+        return self.get(upload_id)
+
+    def get(self, upload_id):
+        with self._connect() as conn:
+            conn.row_factory = sqlite3.Row
+            row = conn.execute("SELECT * FROM uploads WHERE id = ?", (upload_id,)).fetchone()
+        if row is None:
+            return None
+        path = self.spool_path(upload_id, row['filename'])
+        return {
+            'id': row['id'],
+            'filename': row['filename'],
+            'analysis_type': row['analysis_type'],
+            'status': row['status'],
+            'offset': os.path.getsize(path) if os.path.exists(path) else None,
+            'total_bytes': row['total_bytes'],
+            'job_id': row['job_id'],
+            'path': path,
+            'created': row['created'],
+            'updated': row['updated'],
+        }
+
+    def append(self, upload_id, offset, stream):
+        """
+        Appends one part, read from a binary stream, at byte offset. The spool
+        file's size is the source of truth, so a part cut off mid-transfer
+        still counts up to the last byte written and the client resumes there.
+
+        Returns:
+            int: the new offset, or None if the upload does not exist
+        Raises:
+            OffsetMismatch: offset is not where the upload currently ends
+            UploadError: the upload is no longer open or would be too large
+        """
+        upload = self.get(upload_id)
+        if upload is None:
+            return None
+        if upload['status'] != STATUS_OPEN or upload['offset'] is None:
+            raise UploadError(f"Upload is {upload['status'] if upload['offset'] is not None else 'discarded'}")
+
+        with open(upload['path'], 'ab') as f:
+            # One writer per upload, across workers
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                end = f.seek(0, os.SEEK_END)
+                if offset != end:
+                    raise OffsetMismatch(end)
+                limit = min(UPLOAD_MAX_BYTES, upload['total_bytes'] or UPLOAD_MAX_BYTES)
+                for block in iter(lambda: stream.read(_COPY_BLOCK), b''):
+                    if end + len(block) > limit:
+                        raise UploadError(f"Upload is larger than {limit} bytes")
+                    f.write(block)
+                    end += len(block)
+                f.flush()
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+        self._update(upload_id, updated=time.time())
+        return end
+
+    def complete(self, upload_id):
+        """Marks every part as received. Returns the upload, or None if it does not exist."""
+        upload = self.get(upload_id)
+        if upload is None:
+            return None
+        if upload['status'] == STATUS_COMPLETE:
+            return upload
+        if upload['status'] != STATUS_OPEN or upload['offset'] is None:
+            raise UploadError(f"Upload is {upload['status'] if upload['offset'] is not None else 'discarded'}")
+        with open(upload['path'], 'ab') as f:
+            # Waits for an in-flight part to finish
+            fcntl.flock(f, fcntl.LOCK_EX)
+            size = f.seek(0, os.SEEK_END)
+            if upload['total_bytes'] is not None and size != upload['total_bytes']:
+                raise UploadError(f"Received {size} of {upload['total_bytes']} bytes")
+            self._update(upload_id, status=STATUS_COMPLETE, updated=time.time())
+        upload.update(status=STATUS_COMPLETE, offset=size)
+        return upload
+
+    def abort(self, upload_id):
+        """Discards an upload. Returns False if it does not exist."""
+        upload = self.get(upload_id)
+        if upload is None:
+            return False
+        self._update(upload_id, status=STATUS_ABORTED, updated=time.time())
+        self._remove_spool(upload['path'])
+        return True
+
+    def reserve_job(self, upload_id, job_id):
+        """Records job_id as the upload's job unless it already has one. Returns True if it was recorded."""
+        with self._connect() as conn:
+            return conn.execute(
+                "UPDATE uploads SET job_id = ? WHERE id = ? AND job_id IS NULL", (job_id, upload_id)
+            ).rowcount == 1
+
+    def release_job(self, upload_id, job_id):
+        """Detaches a job that gave up on the upload, so the next part or /complete starts another."""
+        with self._connect() as conn:
+            conn.execute("UPDATE uploads SET job_id = NULL WHERE id = ? AND job_id = ?", (upload_id, job_id))
+
+    def spool_path(self, upload_id, filename):
+        _, extension = os.path.splitext(filename)
+        return os.path.join(self.directory, f"{upload_id}{extension.lower()}")
+
+    def open_stream(self, upload_id, on_wait=None):
+        """
+        The upload as a binary stream that can be read while parts are still
+        arriving: reads block until more bytes land, and EOF comes only once
+        the upload is complete. on_wait is called on every poll (e.g. to raise
+        on job cancellation).
+        """
+        return io.BufferedReader(_GrowingFile(self, upload_id, on_wait), _COPY_BLOCK)
+
+    def wait_complete(self, upload_id, on_wait=None):
+        """Blocks until the upload is complete and returns it."""
+        stream = _GrowingFile(self, upload_id, on_wait)
+        try:
+            while stream.wait_for_data(stream.size()):
+                pass
+        finally:
+            stream.close()
+        return self.get(upload_id)
+
+    def stats(self):
+        with self._connect() as conn:
+            counts = dict(conn.execute("SELECT status, COUNT(*) FROM uploads GROUP BY status").fetchall())
+        return {'max_bytes': UPLOAD_MAX_BYTES, 'uploads': counts}
+
+    # --- Internals ---
+
+    def _status(self, upload_id):
+        with self._connect() as conn:
+            row = conn.execute("SELECT status FROM uploads WHERE id = ?", (upload_id,)).fetchone()
+        return row[0] if row else None
+
+    def _update(self, upload_id, **fields):
+        columns = ", ".join(f"{name} = ?" for name in fields)
+        with self._connect() as conn:
+            conn.execute(f"UPDATE uploads SET {columns} WHERE id = ?", (*fields.values(), upload_id))
+
+    def _expire(self):
+        """Drops sessions untouched for UPLOAD_SESSION_TTL. Complete uploads' spools belong to their jobs."""
+        cutoff = time.time() - UPLOAD_SESSION_TTL
+        with self._connect() as conn:
+            rows = conn.execute("SELECT id, filename, status FROM uploads WHERE updated < ?", (cutoff,)).fetchall()
+            for upload_id, filename, status in rows:
+                if status == STATUS_OPEN:
+                    logging.info(f"Discarding abandoned upload {upload_id}")
+                    self._remove_spool(self.spool_path(upload_id, filename))
+                conn.execute("DELETE FROM uploads WHERE id = ?", (upload_id,))
+
+    def _remove_spool(self, path):
+        if os.path.exists(path):
+            try:
+                os.remove(path)
+            except OSError as e:
+                logging.warning(f"Could not remove upload spool {path}: {e}")
+
+class _GrowingFile(io.RawIOBase):
+    """Raw reader over a spool file that waits at EOF until the upload is complete."""
+    def __init__(self, store, upload_id, on_wait=None):
+        upload = store.get(upload_id)
+        if upload is None or upload['offset'] is None:
+            raise UploadError('Upload not found')
+        self._store = store
+        self._upload_id = upload_id
+        self._on_wait = on_wait
+        self._file = open(upload['path'], 'rb')
+
+    def readable(self):
+        return True
+
+    def size(self):
+        return os.fstat(self._file.fileno()).st_size
+
+    def readinto(self, buffer):
+        while True:
+            count = self._file.readinto(buffer)
+            if count or not self.wait_for_data(self._file.tell()):
+                return count
+
+    def wait_for_data(self, position):
+        """Blocks until the spool grows past position (True) or the upload is complete (False)."""
+        idle_since = time.monotonic()
+        while True:
+            if self.size() > position:
+                return True
+            status = self._store._status(self._upload_id)
+            if status == STATUS_COMPLETE:
+                # A last part may have landed between the size check and the status read
+                return self.size() > position
+            if status != STATUS_OPEN:
+                raise UploadError('Upload was discarded before it completed')
+            if self._on_wait:
+                self._on_wait()
+            if time.monotonic() - idle_since > UPLOAD_IDLE_TIMEOUT:
+                raise UploadIdle(f"No new part arrived for {UPLOAD_IDLE_TIMEOUT:.0f}s; "
+                                 "the analysis restarts when the next part arrives")
+            time.sleep(UPLOAD_POLL_SECONDS)
+
+    def close(self):
+        if not self.closed:
+            self._file.close()
+        super().close()
+
+def read_upload(upload_id, stats_only=False, on_wait=None):
+    """
+    Parses an upload for analysis. CSV and TXT uploads are parsed as their
+    parts arrive; other formats need random access, so they wait for the
+    last part and are then read from the spool file.
+    """
+    store = get_upload_store()
+    upload = store.get(upload_id)
+    if upload is None:
+        raise UploadError('Upload not found')
+    _, extension = os.path.splitext(upload['filename'])
+    extension = extension.lower()
+    if extension in STREAMABLE_EXTENSIONS:
+        with store.open_stream(upload_id, on_wait) as stream:
+            return read_stream(stream, extension, stats_only=stats_only)
+    upload = store.wait_complete(upload_id, on_wait)
+    return read_data(upload['path'], stats_only=stats_only)
+
+_store = None
+_store_lock = threading.Lock()
+
+def get_upload_store():
+    """Returns the process-wide upload store, creating it on first use."""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = UploadStore()
+    return _store